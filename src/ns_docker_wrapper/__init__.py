@@ -6,14 +6,27 @@ A Python wrapper for the Nerfstudio Docker image, inspired by ffmpeg-python.
 
 __version__ = "0.2.0"
 
-from .manager import init
+from .manager import DockerManager, init
+from .gpus import GpuPool
+from .progress import ProgressEvent
+from .results import RunResult
 from .commands import train, process_data, process_images, custom_command, path
+from .pipeline import Pipeline
+from .sweep import Sweep
+from .transforms import ImageTransform
 
 __all__ = [
+    "DockerManager",
+    "GpuPool",
+    "ProgressEvent",
+    "RunResult",
     "init",
     "train",
     "process_data",
     "process_images",
     "custom_command",
     "path",
+    "Pipeline",
+    "Sweep",
+    "ImageTransform",
 ]
@@ -1,25 +1,53 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
-from typing import List, Optional, Union
+import time
+from datetime import datetime
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Union
 
-from .manager import _get_manager
+from .jobs import Job
+from .manager import DockerManager, _get_manager
+from .output import CommandLog
+from .progress import ProgressEvent
+from .results import RunIndex, RunResult, latest_checkpoint, scan_outputs
+from .staging import FileFilter, fingerprint
+from .transforms import ImageTransform
+
+# Where ns-train writes its runs when no --output-dir is given
+DEFAULT_TRAIN_OUTPUT_DIR = "outputs"
 
 
 class PathArgument:
     """A special wrapper for local paths.
 
-    This wrapper indicates that the path needs to be copied into the Docker
-    container's internal temporary volume before being passed to Nerfstudio.
+    This wrapper indicates that the path needs to be staged (copied into the Docker
+    container's internal temporary volume, or bind-mounted) before being passed
+    to Nerfstudio.
 
     Args:
         local_path (str): The local path to the file or directory.
         copy_depth (int): The depth to copy the directory structure.
+        mode (Optional[str]): The staging mode to use, or None for the manager's default.
+        file_filter (Optional[FileFilter]): Selects the files of a directory to stage.
+        transform (Optional[ImageTransform]): Resizes the images while they are staged.
     """
 
-    def __init__(self, local_path: str, copy_depth: int):
+    def __init__(
+        self,
+        local_path: str,
+        copy_depth: int,
+        mode: Optional[str] = None,
+        file_filter: Optional[FileFilter] = None,
+        transform: Optional[ImageTransform] = None,
+    ):
         self.local_path = local_path
         self.copy_depth = copy_depth
+        self.mode = mode
+        self.file_filter = file_filter
+        self.transform = transform
 
 
 class ArgumentBuilder:
@@ -56,7 +84,7 @@ class ArgumentBuilder:
     ) -> Command:
         """Sets the value for the constructed argument.
 
-        If the value is a PathArgument, it will be copied to an internal temporary volume.
+        If the value is a PathArgument, it will be staged into the container.
 
         Args:
             value (Optional[Union[str, int, float, bool, PathArgument]]): The value
@@ -68,9 +96,7 @@ class ArgumentBuilder:
             Command: The command with the new argument.
         """
         if isinstance(value, PathArgument):
-            container_path = self._command._manager.copy_to_ns_temp_data(
-                value.local_path, value.copy_depth
-            )
+            container_path = self._command._stage_path(value)
             return self._command._add_arg(
                 self._original_name, container_path, keep_underscore
             )
@@ -81,17 +107,30 @@ class ArgumentBuilder:
 class Command:
     """Represents a Nerfstudio command to be executed."""
 
-    def __init__(self, base_command: str):
+    def __init__(self, base_command: str, manager: Optional[DockerManager] = None):
         """Initializes the Command.
 
         Args:
             base_command (str): The base command to execute.
+            manager (Optional[DockerManager]): The manager that stages the inputs and
+                runs the command. Defaults to the one created by nsdw.init().
         """
-        self._manager = _get_manager()
+        self._manager = manager if manager is not None else _get_manager()
         self._command_args: List[str] = [base_command]
+        self._staging_futures: List[Future] = []
+        # Inputs staged for the command, and their container paths
+        self._inputs: List[PathArgument] = []
+        self._input_paths: List[str] = []
+        # Whether ns-train loads the latest checkpoint of the experiment, see train()
+        self._resume = False
+        # Exit code of the last execution, None until the command has finished
+        self.exit_code: Optional[int] = None
 
     def _add_arg(
-        self, key: str, value: Optional[Union[str, int, float, bool]], keep_underscore: bool = False
+        self,
+        key: str,
+        value: Optional[Union[str, int, float, bool]],
+        keep_underscore: bool = False,
     ) -> Command:
         """Adds a standard --key value argument.
 
@@ -105,12 +144,83 @@ class Command:
         Returns:
             Command: The command with the new argument.
         """
-        arg_name = key if keep_underscore else key.replace('_', '-')
+        arg_name = key if keep_underscore else key.replace("_", "-")
         self._command_args.append(f"--{arg_name}")
         if value is not None:
             self._command_args.append(str(value))
         return self
 
+    def _copy(self) -> Command:
+        """Returns a copy of the command, sharing its staged inputs."""
+        command = Command(self._command_args[0], self._manager)
+        command._command_args = list(self._command_args)
+        command._staging_futures = list(self._staging_futures)
+        command._inputs = list(self._inputs)
+        command._input_paths = list(self._input_paths)
+        command._resume = self._resume
+        return command
+
+    def _set_arg(
+        self, key: str, value: Optional[Union[str, int, float, bool]]
+    ) -> Command:
+        """Sets a --key value argument, replacing the previous values of the key.
+
+        A new argument goes right after the base command, so that it is not parsed
+        as an argument of a subcommand (e.g. the data parser of ns-train).
+
+        Args:
+            key (str): The name of the argument, in dot-notation for nested ones.
+            value (Optional[Union[str, int, float, bool]]): The value of the
+                argument.
+
+        Returns:
+            Command: The command with the argument set.
+        """
+        flag = f"--{key.replace('_', '-')}"
+        args = self._command_args
+        position = args.index(flag) if flag in args else 1
+        while flag in args:
+            i = args.index(flag)
+            has_value = i + 1 < len(args) and not args[i + 1].startswith("--")
+            del args[i : i + 2 if has_value else i + 1]
+        args[position:position] = [flag] if value is None else [flag, str(value)]
+        return self
+
+    def _stage_path(self, path_argument: PathArgument) -> str:
+        """Plans the staging of a wrapped local path with the command's manager.
+
+        The copy starts when the command runs, so an up-to-date memoized command
+        skips it.
+
+        Args:
+            path_argument (PathArgument): The wrapped local path.
+
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        container_path, future = self._manager.stage_path_in_background(
+            path_argument.local_path,
+            path_argument.copy_depth,
+            path_argument.mode,
+            path_argument.file_filter,
+            path_argument.transform,
+            defer=True,
+        )
+        self._staging_futures.append(future)
+        self._inputs.append(path_argument)
+        self._input_paths.append(container_path)
+        return container_path
+
+    def _wait_for_staging(self):
+        """Waits until every input of the command is staged.
+
+        Raises:
+            Exception: Any error raised while staging an input.
+        """
+        self._manager.start_staging(self._staging_futures)
+        for future in self._staging_futures:
+            future.result()
+
     def add_positional_arg(self, value: str) -> Command:
         """Adds a positional argument.
 
@@ -128,15 +238,410 @@ class Command:
         self._command_args.append(value)
         return self
 
-    def run(self) -> tuple[int, str]:
+    def run(
+        self,
+        num_gpus: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+        memoize: bool = False,
+    ) -> RunResult:
         """
-        Executes the command and returns the exit code or output.
+        Executes the command and returns the exit code, output and written files.
+
+        Args:
+            num_gpus (Optional[int]): The number of GPUs to pin the command to when
+                nsdw.init() was given GPUs to schedule on. Defaults to 1. With 0,
+                the command does not wait for GPUs and sees all of them.
+            on_line (Optional[Callable[[str], None]]): Called with each complete line
+                of output, without its line ending, while the command runs.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+                training progress (step, throughput, ETA, loss...) as ns-train
+                prints it.
+            timeout (Optional[float]): The maximum number of seconds the command may
+                run. It is then terminated, and so is a command interrupted with
+                Ctrl-C.
+            memoize (bool): Whether to skip the command if it already succeeded with
+                the same arguments and inputs, and the files it wrote still exist.
+                The result of that run is returned instead.
+
+        Returns:
+            RunResult: The result of the command, which unpacks as a tuple of its
+                exit code and output. The output is a handle to the log file when
+                nsdw.init() was given an output_tail_size. The result also gives the
+                config, checkpoints and exports the command wrote.
+
+        Raises:
+            TimeoutError: If the command ran for longer than timeout seconds.
+        """
+
+        key = self._run_key() if memoize else None
+        if key is not None and (cached := self._cached_result(key)) is not None:
+            return cached
+
+        started = time.time()
+        self._wait_for_staging()
+        staged = time.time()
+        timestamp = self._new_timestamp()
+        self.exit_code, output = self._manager.execute_command(
+            self._arguments(timestamp),
+            num_gpus=num_gpus,
+            on_line=on_line,
+            on_progress=on_progress,
+            timeout=timeout,
+        )
+        return self._record(key, self._result(output, started, staged, timestamp))
+
+    def _arg_value(self, *names: str) -> Optional[str]:
+        """Returns the value of the last of some arguments given to the command."""
+        value = None
+        for key, next_value in zip(self._command_args, self._command_args[1:]):
+            if key in names:
+                value = next_value
+        return value
+
+    def _experiment_directory(self) -> Optional[str]:
+        """Returns the host directory holding the runs of the training.
+
+        ns-train writes its runs to output_dir/experiment_name/method_name/timestamp,
+        where the experiment is named after the data directory unless it is given.
+
+        Returns:
+            Optional[str]: The directory, or None if the output directory is outside
+                the workspace.
+        """
+        experiment_name = self._arg_value("--experiment-name")
+        if experiment_name is None:
+            data = self._arg_value("--data", "--pipeline.datamanager.data")
+            if data is None:
+                experiment_name = "unnamed"
+            else:
+                if data in self._input_paths:
+                    local_path = self._inputs[self._input_paths.index(data)].local_path
+                    is_file = os.path.isfile(local_path)
+                else:
+                    host_path = self._manager._to_host_path(data)
+                    is_file = host_path is not None and os.path.isfile(host_path)
+                if is_file:
+                    data = os.path.dirname(data)
+                experiment_name = os.path.splitext(os.path.basename(data.rstrip("/")))[
+                    0
+                ]
+        method_name = (
+            self._arg_value("--method-name") or self._command_args[0].split()[1]
+        )
+        output_dir = self._manager._to_host_path(
+            self._arg_value("--output-dir") or DEFAULT_TRAIN_OUTPUT_DIR
+        )
+        if output_dir is None:
+            return None
+        return os.path.join(output_dir, experiment_name, method_name)
+
+    def _is_training(self) -> bool:
+        """Returns whether the command runs ns-train."""
+        return self._command_args[0].split()[0] == "ns-train"
+
+    def _new_timestamp(self) -> Optional[str]:
+        """Returns the name of the run directory to pin for an ns-train execution.
+
+        Pinning it lets the result be collected from that run only, even when other
+        runs of the same experiment write to the same directory at the same time.
 
         Returns:
-            tuple[int, str]: The exit code or output of the command execution.
+            Optional[str]: A unique timestamp, or None if the command is not a
+                training or already has a --timestamp.
+        """
+        if not self._is_training() or self._arg_value("--timestamp") is not None:
+            return None
+        return datetime.now().strftime("%Y-%m-%d_%H%M%S_%f")
+
+    def _arguments(self, timestamp: Optional[str] = None) -> List[str]:
+        """Returns the arguments to execute.
+
+        When resuming, the latest complete checkpoint of the experiment is loaded.
+        The added arguments go right after the method, before the arguments of a
+        data parser subcommand.
+
+        Args:
+            timestamp (Optional[str]): The run directory to pin with --timestamp,
+                see _new_timestamp().
         """
+        extra_args = []
+        if timestamp is not None:
+            extra_args += ["--timestamp", timestamp]
+        if self._resume and not self._arg_value("--load-dir", "--load-checkpoint"):
+            experiment_dir = self._experiment_directory()
+            checkpoint = latest_checkpoint(experiment_dir) if experiment_dir else None
+            if checkpoint is None:
+                logging.info(
+                    f"No checkpoint to resume from in {experiment_dir}, training from scratch."
+                )
+            else:
+                path, step = checkpoint
+                logging.info(f"Resuming from {path}: {step} steps already trained.")
+                extra_args += [
+                    "--load-checkpoint",
+                    self._manager._to_workspace_path(path),
+                ]
+        if not extra_args:
+            return self._command_args
+        return [self._command_args[0], *extra_args, *self._command_args[1:]]
+
+    def _output_directories(self, timestamp: Optional[str] = None) -> list[str]:
+        """Returns the host paths the command writes its outputs to.
+
+        For ns-train, this is the directory of the run, or of the experiment when
+        the run is not known. For other commands, these are the values of the
+        --output-dir and --output-path arguments.
 
-        return self._manager.execute_command(self._command_args)
+        Args:
+            timestamp (Optional[str]): The run directory pinned for ns-train.
+        """
+        if self._is_training():
+            experiment_dir = self._experiment_directory()
+            if experiment_dir is None:
+                return []
+            timestamp = timestamp or self._arg_value("--timestamp")
+            if timestamp is None or "{" in timestamp:
+                return [experiment_dir]
+            return [os.path.join(experiment_dir, timestamp)]
+
+        paths = [
+            value
+            for key, value in zip(self._command_args, self._command_args[1:])
+            if key in ("--output-dir", "--output-path")
+        ]
+        host_paths = (self._manager._to_host_path(path) for path in paths)
+        return [path for path in host_paths if path is not None]
+
+    def _result(
+        self,
+        output: Union[str, CommandLog],
+        started: float,
+        staged: float,
+        timestamp: Optional[str] = None,
+    ) -> RunResult:
+        """Collects the result of an execution of the command.
+
+        Args:
+            output (Union[str, CommandLog]): The output of the command.
+            started (float): When run() was called.
+            staged (float): When the inputs were staged and the command started.
+            timestamp (Optional[str]): The run directory pinned for ns-train.
+
+        Returns:
+            RunResult: The result, with the files written since the command started.
+        """
+        finished = time.time()
+        output_dirs = self._output_directories(timestamp)
+        # Leave some slack for file systems with coarse modification times
+        files = scan_outputs(output_dirs, since=staged - 1)
+        return RunResult(
+            self.exit_code,  # type: ignore
+            output,
+            files,
+            timings={
+                "staging": staged - started,
+                "execution": finished - staged,
+                "total": finished - started,
+            },
+            host_base_path=self._manager.output_base_path,
+            container_base_path=self._manager.workspace_path,
+            output_dirs=output_dirs,
+        )
+
+    def _run_key(self) -> str:
+        """Identifies the command by its arguments and the state of its inputs.
+
+        Staged inputs are identified by a fingerprint of their source rather than
+        by their container path, which changes across sessions in some staging
+        modes. Arguments pointing to existing files of the workspace, e.g. the
+        output of a previous command, are fingerprinted as well.
+
+        Returns:
+            str: The key of the command in the manager's run index.
+        """
+        input_indices = {path: i for i, path in enumerate(self._input_paths)}
+        argv = []
+        fingerprints = []
+        for i, value in enumerate(self._command_args):
+            if value in input_indices:
+                argv.append(f"<input {input_indices[value]}>")
+                continue
+            argv.append(value)
+            if i == 0 or value.startswith("-"):
+                continue
+            if self._command_args[i - 1] in ("--output-dir", "--output-path"):
+                continue
+            host_path = self._manager._to_host_path(value)
+            if host_path is not None and os.path.exists(host_path):
+                fingerprints.append(fingerprint(host_path))
+
+        for path_argument in self._inputs:
+            # The whole staged source counts, i.e. the parent directory with copy_depth
+            local_path, src_path = self._manager._resolve_source(
+                path_argument.local_path, path_argument.copy_depth
+            )
+            fingerprints.append(fingerprint(src_path, path_argument.file_filter))
+            fingerprints.append(os.path.relpath(local_path, src_path))
+            if path_argument.file_filter is not None:
+                fingerprints.append(path_argument.file_filter.key())
+            if path_argument.transform is not None:
+                fingerprints.append(path_argument.transform.key())
+        return RunIndex.run_key(argv, fingerprints)
+
+    def _cached_result(self, key: str) -> Optional[RunResult]:
+        """Returns the result of a previous identical run, if it is still valid."""
+        result = self._manager.run_index.get(
+            key, self._manager.output_base_path, self._manager.workspace_path
+        )
+        if result is not None:
+            logging.info(f"Skipping up-to-date command: {' '.join(self._command_args)}")
+            self.exit_code = result.exit_code
+        return result
+
+    def _record(self, key: Optional[str], result: RunResult) -> RunResult:
+        """Records a successful run in the run index when memoizing."""
+        if key is not None and result.exit_code == 0:
+            self._manager.run_index.put(key, self._command_args, result)
+        return result
+
+    def submit(
+        self,
+        echo: bool = True,
+        num_gpus: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Job:
+        """
+        Starts the command in the background and returns immediately.
+
+        The command starts once its inputs are staged and, when nsdw.init() was
+        given GPUs to schedule on, once enough GPUs are free. The returned job can
+        be polled, waited for, cancelled, and its output read while it runs.
+
+        Args:
+            echo (bool): Whether the output is also written to stdout.
+            num_gpus (Optional[int]): The number of GPUs to pin the command to.
+                Defaults to 1. With 0, the command does not wait for GPUs.
+            on_line (Optional[Callable[[str], None]]): Called with each complete line
+                of output, from the thread reading the output.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+                training progress as ns-train prints it, from the same thread. The
+                latest progress is also available from the job.
+            timeout (Optional[float]): The maximum number of seconds the command may
+                run before it is cancelled. The job's timed_out attribute is then
+                set.
+
+        Returns:
+            Job: A handle to the running command.
+        """
+
+        self._manager.start_staging(self._staging_futures)
+        return self._manager.start_command(
+            self._arguments(),
+            echo=echo,
+            wait_for=self._staging_futures,
+            num_gpus=num_gpus,
+            on_line=on_line,
+            on_progress=on_progress,
+            timeout=timeout,
+        )
+
+    async def _wait_for_staging_async(self):
+        """Waits until every input of the command is staged, without blocking.
+
+        Raises:
+            Exception: Any error raised while staging an input.
+        """
+        self._manager.start_staging(self._staging_futures)
+        for future in self._staging_futures:
+            await asyncio.wrap_future(future)
+
+    async def run_async(
+        self,
+        echo: bool = True,
+        num_gpus: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+        memoize: bool = False,
+    ) -> RunResult:
+        """
+        Executes the command from an event loop and returns its result.
+
+        Unlike run(), this does not block the event loop, so several commands can
+        run concurrently, e.g. with asyncio.gather().
+
+        Args:
+            echo (bool): Whether the output is also written to stdout.
+            num_gpus (Optional[int]): The number of GPUs to pin the command to when
+                nsdw.init() was given GPUs to schedule on. Defaults to 1. With 0,
+                the command does not wait for GPUs and sees all of them.
+            on_line (Optional[Callable[[str], None]]): Called from the event loop with
+                each complete line of output.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called from the
+                event loop with the training progress as ns-train prints it.
+            timeout (Optional[float]): The maximum number of seconds the command may
+                run. It is then terminated, and so is a command whose task is
+                cancelled.
+            memoize (bool): Whether to skip the command if it is up to date, see
+                run().
+
+        Returns:
+            RunResult: The result of the command, see run().
+
+        Raises:
+            TimeoutError: If the command ran for longer than timeout seconds.
+        """
+
+        key = self._run_key() if memoize else None
+        if key is not None and (cached := self._cached_result(key)) is not None:
+            return cached
+
+        started = time.time()
+        await self._wait_for_staging_async()
+        staged = time.time()
+        timestamp = self._new_timestamp()
+        self.exit_code, output = await self._manager.execute_command_async(
+            self._arguments(timestamp),
+            on_output=None if echo else _discard,
+            num_gpus=num_gpus,
+            on_line=on_line,
+            on_progress=on_progress,
+            timeout=timeout,
+        )
+        return self._record(key, self._result(output, started, staged, timestamp))
+
+    async def iter_lines(self) -> AsyncIterator[str]:
+        """
+        Executes the command from an event loop and yields its output line by line.
+
+        The output is not written to stdout. Once the iteration is over, the exit
+        code is available in the exit_code attribute. Breaking out of the loop
+        early terminates the command, like cancelling run_async().
+
+        Yields:
+            str: The lines of output, without their line ending.
+        """
+
+        await self._wait_for_staging_async()
+        queue: asyncio.Queue = asyncio.Queue()
+        execution = asyncio.ensure_future(
+            self._manager.execute_command_async(
+                self._arguments(), on_output=_discard, on_line=queue.put_nowait
+            )
+        )
+        execution.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while (line := await queue.get()) is not None:
+                yield line
+            self.exit_code, _ = await execution
+        finally:
+            if not execution.done():
+                execution.cancel()
 
     def __getattr__(self, name: str) -> ArgumentBuilder:
         """Dynamically creates methods for Nerfstudio arguments.
@@ -159,25 +664,44 @@ class Command:
         return ArgumentBuilder(self, original_name, formatted_name)
 
 
+def _discard(text: str):
+    """Ignores command output."""
+
+
 # --- Command Factory Functions ---
 
 
-def train(method: str) -> Command:
+def train(
+    method: str, manager: Optional[DockerManager] = None, resume: bool = False
+) -> Command:
     """Creates a 'ns-train' command.
 
-    When executed with .run(), this command returns the absolute path to the
-    training config.yml file.
+    When executed with .run(), the result gives the paths of the training
+    config.yml file and checkpoint directory, see RunResult.
 
     Args:
         method (str): The training method to use.
+        manager (Optional[DockerManager]): The manager to run the command with.
+            Defaults to the one created by nsdw.init().
+        resume (bool): Whether to resume an interrupted training. When the command
+            is executed, the latest complete checkpoint saved by a previous run of
+            the same experiment (same output directory, experiment name and method)
+            is loaded with --load-checkpoint. Without one, the training starts from
+            scratch.
 
     Returns:
         Command: A new Command object for the train command.
     """
-    return Command(f"ns-train {method}")
+    cmd = Command(f"ns-train {method}", manager)
+    cmd._resume = resume
+    return cmd
 
 
-def process_data(processor: str, data_path: Union[str, PathArgument]) -> Command:
+def process_data(
+    processor: str,
+    data_path: Union[str, PathArgument],
+    manager: Optional[DockerManager] = None,
+) -> Command:
     """Creates a 'ns-process-data' command.
 
     Args:
@@ -185,17 +709,17 @@ def process_data(processor: str, data_path: Union[str, PathArgument]) -> Command
         data_path (Union[str, PathArgument]): The path to the data. Can be a local
             path wrapped with nsdw.path() or a path relative to output_base_path
             (which corresponds to /workspace in Docker mode).
+        manager (Optional[DockerManager]): The manager to run the command with.
+            Defaults to the one created by nsdw.init().
 
     Returns:
         Command: A new Command object for the process-data command.
     """
-    cmd = Command(f"ns-process-data {processor}")
+    cmd = Command(f"ns-process-data {processor}", manager)
 
     # Handle data_path argument based on its type
     if isinstance(data_path, PathArgument):
-        container_path = cmd._manager.copy_to_ns_temp_data(
-            data_path.local_path, data_path.copy_depth
-        )
+        container_path = cmd._stage_path(data_path)
         cmd._add_arg("data", container_path)
     else:
         # Assume it's a path relative to /workspace
@@ -204,7 +728,9 @@ def process_data(processor: str, data_path: Union[str, PathArgument]) -> Command
 
 
 def process_images(
-    input_image_path: Union[str, PathArgument], output_dir: str
+    input_image_path: Union[str, PathArgument],
+    output_dir: str,
+    manager: Optional[DockerManager] = None,
 ) -> Command:
     """Creates a 'ns-process-data images' command.
 
@@ -214,15 +740,15 @@ def process_images(
             output_base_path (which corresponds to /workspace in Docker mode).
         output_dir (str): The path to the output directory, relative to
             output_base_path.
+        manager (Optional[DockerManager]): The manager to run the command with.
+            Defaults to the one created by nsdw.init().
 
     Returns:
         Command: A new Command object for the process-images command.
     """
-    cmd = Command("ns-process-data images")
+    cmd = Command("ns-process-data images", manager)
     if isinstance(input_image_path, PathArgument):
-        container_path = cmd._manager.copy_to_ns_temp_data(
-            input_image_path.local_path, input_image_path.copy_depth
-        )
+        container_path = cmd._stage_path(input_image_path)
         cmd._add_arg("data", container_path)
     else:
         cmd._add_arg("data", input_image_path)
@@ -231,30 +757,60 @@ def process_images(
     return cmd
 
 
-def custom_command(command_string: str) -> Command:
+def custom_command(
+    command_string: str, manager: Optional[DockerManager] = None
+) -> Command:
     """Creates a custom command to be run.
 
     Args:
         command_string (str): The command to run.
+        manager (Optional[DockerManager]): The manager to run the command with.
+            Defaults to the one created by nsdw.init().
 
     Returns:
         Command: A new Command object for the custom command.
     """
-    return Command(command_string)
-
-
-def path(local_path: str, copy_depth: int = 0) -> PathArgument:
+    return Command(command_string, manager)
+
+
+def path(
+    local_path: str,
+    copy_depth: int = 0,
+    mode: Optional[str] = None,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    extensions: Optional[Iterable[str]] = None,
+    max_file_size: Optional[int] = None,
+    transform: Optional[ImageTransform] = None,
+) -> PathArgument:
     """Wraps a local file system path.
 
-    This indicates that it should be copied into an internal temporary volume
-    before being used by Nerfstudio. This is useful for data that is not
-    already in the output_base_path.
+    This indicates that it should be staged (copied into an internal temporary
+    volume, or bind-mounted read-only) before being used by Nerfstudio. This is
+    useful for data that is not already in the output_base_path.
+
+    When a directory is copied, only the files selected by the include, exclude,
+    extensions and max_file_size filters are staged. Filters are not supported by
+    the "mount" mode.
 
     Args:
         local_path (str): The local path to the file or directory.
         copy_depth (int): The depth to copy the directory structure.
+        mode (Optional[str]): The staging mode: "copy", "mount", "cache", "sync" or
+            "archive". Defaults to the staging_mode given to nsdw.init().
+        include (Optional[Iterable[str]]): Glob patterns of the files to stage,
+            matched against their name and their path relative to the directory.
+        exclude (Optional[Iterable[str]]): Glob patterns of the files and
+            directories to skip.
+        extensions (Optional[Iterable[str]]): The file extensions to stage, e.g.
+            [".jpg", ".png"]. Case-insensitive.
+        max_file_size (Optional[int]): Files larger than this many bytes are skipped.
+        transform (Optional[ImageTransform]): Resizes and re-encodes the images on
+            the host while they are staged, see nsdw.ImageTransform. Supported by the
+            "copy", "cache" and "archive" modes.
 
     Returns:
         PathArgument: A new PathArgument object.
     """
-    return PathArgument(local_path, copy_depth)
+    file_filter = FileFilter(include, exclude, extensions, max_file_size)
+    return PathArgument(local_path, copy_depth, mode, file_filter, transform)
@@ -0,0 +1,182 @@
+"""A fork server running Nerfstudio entry points without paying their startup cost.
+
+This script runs inside the container (or on the host in local mode) and only
+depends on the standard library, as it is executed by the container's Python
+rather than imported from the ns_docker_wrapper package. It imports the heavy
+modules once, listens on a Unix socket and forks a child for every request, so
+commands start with torch and nerfstudio already imported.
+
+Protocol: the client sends one JSON line {"argv": [...], "cwd": ..., "env": {...},
+"kill_timeout": ...}. The server answers with frames made of a one byte type, a 4
+bytes big-endian length and a payload: "O" frames carry output bytes and a final
+"X" frame carries the exit code as ASCII. Closing the sending side of the
+connection terminates the command: its process group receives SIGINT, then
+SIGKILL after kill_timeout seconds.
+
+Usage: python fork_server.py SOCKET_PATH [MODULE ...]
+"""
+
+import importlib
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+FRAME_HEADER = struct.Struct(">cI")
+
+
+def send_frame(conn: socket.socket, frame_type: bytes, payload: bytes):
+    conn.sendall(FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def preload(modules: list[str]):
+    """Imports the modules shared by the forked commands."""
+    if not modules:
+        from importlib.metadata import entry_points
+
+        modules = [
+            entry_point.module
+            for entry_point in entry_points(group="console_scripts")
+            if entry_point.name.startswith("ns-")
+        ]
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"fork server: could not preload {module}: {e}", file=sys.stderr)
+
+
+def find_entry_point(name: str):
+    """Returns the console script called name, or None."""
+    from importlib.metadata import entry_points
+
+    for entry_point in entry_points(group="console_scripts", name=name):
+        return entry_point
+    return None
+
+
+def run_command(request: dict, output_fd: int):
+    """Runs a command in the current (forked) process. Never returns."""
+    os.dup2(output_fd, 1)
+    os.dup2(output_fd, 2)
+    os.close(output_fd)
+    sys.stdout = open(1, "w", buffering=1, closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False)
+    exit_code = 1
+    try:
+        argv = request["argv"]
+        os.chdir(request.get("cwd") or os.getcwd())
+        os.environ.update(request.get("env") or {})
+        entry_point = find_entry_point(argv[0])
+        if entry_point is None:
+            os.execvp(argv[0], argv)
+
+        sys.argv = argv
+        try:
+            entry_point.load()()
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+
+def handle_connection(conn: socket.socket):
+    """Serves one request in a process forked from the server. Never returns."""
+    pid = None
+    try:
+        with conn.makefile("rb") as reader:
+            line = reader.readline()
+        if not line:
+            return  # A liveness probe of the client
+        request = json.loads(line)
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            conn.close()
+            os.close(read_fd)
+            os.setsid()
+            run_command(request, write_fd)
+        os.close(write_fd)
+
+        watched = [read_fd, conn]
+        kill_deadline = None
+        while True:
+            timeout = None
+            if kill_deadline is not None:
+                timeout = max(0.0, kill_deadline - time.monotonic())
+            readable, _, _ = select.select(watched, [], [], timeout)
+            if kill_deadline is not None and time.monotonic() >= kill_deadline:
+                terminate(pid, signal.SIGKILL)
+                kill_deadline = None
+            if conn in readable and not conn.recv(1):
+                # The client cancelled the command or went away
+                watched.remove(conn)
+                terminate(pid, signal.SIGINT)
+                kill_deadline = time.monotonic() + request.get("kill_timeout", 10.0)
+            if read_fd in readable:
+                data = os.read(read_fd, 65536)
+                if not data:
+                    break
+                send_frame(conn, b"O", data)
+
+        _, status = os.waitpid(pid, 0)
+        pid = None
+        send_frame(conn, b"X", str(os.waitstatus_to_exitcode(status)).encode("ascii"))
+    except OSError:
+        if pid is not None:
+            terminate(pid, signal.SIGKILL)
+    finally:
+        conn.close()
+        os._exit(0)
+
+
+def terminate(pid: int, sig: int):
+    """Sends a signal to the process group of a command."""
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def serve(socket_path: str, modules: list[str]):
+    preload(modules)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # Reap connection handlers
+
+    for path in (socket_path, socket_path + ".partial"):
+        if os.path.exists(path):
+            os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path + ".partial")
+    server.listen(64)
+    # Only expose the socket once the modules are loaded
+    os.rename(socket_path + ".partial", socket_path)
+    print(f"fork server: listening on {socket_path}", flush=True)
+
+    while True:
+        conn, _ = server.accept()
+        if os.fork() == 0:
+            server.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            handle_connection(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import subprocess
+import threading
+from typing import Callable, Optional, Sequence, Union
+
+
+def detect_gpus(
+    run: Optional[Callable[[list[str]], tuple[int, Union[str, bytes]]]] = None,
+) -> list[str]:
+    """Lists the GPUs visible to nvidia-smi.
+
+    Args:
+        run (Optional[Callable[[list[str]], tuple[int, Union[str, bytes]]]]): Runs a
+            command and returns its exit code and output, e.g. inside the container
+            with exec_run(), which returns bytes. Defaults to running it on the
+            host.
+
+    Returns:
+        list[str]: The indices of the GPUs, empty if nvidia-smi is not available.
+    """
+    command = ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"]
+    if run is None:
+
+        def run(command: list[str]) -> tuple[int, str]:
+            try:
+                result = subprocess.run(command, capture_output=True, text=True)
+            except FileNotFoundError:
+                return 127, ""
+            return result.returncode, result.stdout
+
+    exit_code, output = run(command)
+    if exit_code != 0:
+        logging.warning("Could not list the GPUs with nvidia-smi.")
+        return []
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", errors="replace")
+    return [line.strip() for line in output.splitlines() if line.strip()]
+
+
+class GpuPool:
+    """Hands out GPUs to commands, so that each one runs on its own devices.
+
+    Commands that ask for more GPUs than are free wait until enough are released.
+
+    Args:
+        devices (Union[int, Sequence[Union[int, str]]]): The GPUs to schedule on,
+            either a number of GPUs (0 to n - 1) or a list of device IDs.
+    """
+
+    def __init__(self, devices: Union[int, Sequence[Union[int, str]]]):
+        if isinstance(devices, int):
+            devices = range(devices)
+        self.devices = [str(device) for device in devices]
+        if not self.devices:
+            raise ValueError("A GPU pool needs at least one device.")
+        self._free = list(self.devices)
+        self._condition = threading.Condition()
+        # Tasks waiting in acquire_async(): (event loop, future, number of GPUs)
+        self._async_waiters: list[
+            tuple[asyncio.AbstractEventLoop, asyncio.Future, int]
+        ] = []
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def _check_count(self, count: int):
+        """Rejects requests that could never be satisfied."""
+        if not 1 <= count <= len(self.devices):
+            raise ValueError(
+                f"Cannot allocate {count} GPU(s) from a pool of {len(self.devices)}."
+            )
+
+    def try_acquire(self, count: int = 1) -> Optional[list[str]]:
+        """Takes GPUs from the pool if enough are free.
+
+        Args:
+            count (int): The number of GPUs to take.
+
+        Returns:
+            Optional[list[str]]: The device IDs, or None if not enough are free.
+        """
+        self._check_count(count)
+        with self._condition:
+            if len(self._free) < count:
+                return None
+            devices, self._free = self._free[:count], self._free[count:]
+            return devices
+
+    def acquire(
+        self, count: int = 1, cancelled: Optional[Callable[[], bool]] = None
+    ) -> Optional[list[str]]:
+        """Takes GPUs from the pool, waiting until enough are free.
+
+        Args:
+            count (int): The number of GPUs to take.
+            cancelled (Optional[Callable[[], bool]]): Checked while waiting; the
+                wait is abandoned once it returns True.
+
+        Returns:
+            Optional[list[str]]: The device IDs, or None if the wait was cancelled.
+        """
+        self._check_count(count)
+        with self._condition:
+            while len(self._free) < count:
+                if cancelled is not None and cancelled():
+                    return None
+                self._condition.wait(timeout=0.5)
+            devices, self._free = self._free[:count], self._free[count:]
+            return devices
+
+    async def acquire_async(self, count: int = 1) -> list[str]:
+        """Takes GPUs from the pool without blocking the event loop.
+
+        The wait does not occupy a thread: release() hands the GPUs to the waiting
+        task through the event loop. Cancelling the task abandons the wait, and
+        returns the GPUs if they were just handed to it.
+
+        Args:
+            count (int): The number of GPUs to take.
+
+        Returns:
+            list[str]: The device IDs.
+        """
+        self._check_count(count)
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if len(self._free) >= count and not self._async_waiters:
+                devices, self._free = self._free[:count], self._free[count:]
+                return devices
+            future: asyncio.Future = loop.create_future()
+            waiter = (loop, future, count)
+            self._async_waiters.append(waiter)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            with self._condition:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            raise
+
+    def _hand_out(self):
+        """Gives free GPUs to the waiting tasks, in order. Called with the lock."""
+        while self._async_waiters:
+            loop, future, count = self._async_waiters[0]
+            if len(self._free) < count:
+                return
+            self._async_waiters.pop(0)
+            devices, self._free = self._free[:count], self._free[count:]
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, devices)
+            except RuntimeError:
+                # The loop of the task is closed
+                self._free = self._sorted(self._free + devices)
+
+    def _resolve(self, future: asyncio.Future, devices: list[str]):
+        """Completes the wait of a task, from its event loop."""
+        if future.cancelled():
+            self.release(devices)
+        else:
+            future.set_result(devices)
+
+    def _sorted(self, devices: Sequence[str]) -> list[str]:
+        # Keep the pool in device order, so that jobs get predictable GPUs
+        return [device for device in self.devices if device in devices]
+
+    def release(self, devices: Sequence[str]):
+        """Returns GPUs to the pool.
+
+        Args:
+            devices (Sequence[str]): The device IDs returned by acquire().
+        """
+        with self._condition:
+            self._free = self._sorted([*self._free, *devices])
+            self._hand_out()
+            self._condition.notify_all()
@@ -0,0 +1,655 @@
+import abc
+import json
+import logging
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import threading
+import uuid
+from concurrent import futures
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator, Optional
+
+from .fork_server import FRAME_HEADER
+from .gpus import GpuPool
+from .output import CommandLog, OutputBuffer, OutputPipeline, TerminalEcho
+from .progress import ProgressEvent, TrainProgressParser
+
+DEFAULT_KILL_TIMEOUT = 10.0
+
+# Sends SIGINT to the process group of the command whose PID is in the file "$0",
+# then SIGKILL if it is still running after "$1" tenths of a second, or to the
+# processes it left behind, and removes the PID file. The PID file may not be
+# written yet if the command has just started. With a TTY, commands started by
+# docker exec lead their own process group; otherwise only the command itself is
+# signalled.
+_TERMINATE_SCRIPT = """
+trap 'rm -f "$0"' EXIT
+for i in $(seq 50); do [ -s "$0" ] && break; sleep 0.1; done
+pid=$(cat "$0") || exit 0
+kill -INT "-$pid" 2>/dev/null || kill -INT "$pid" || exit 0
+i=0
+while kill -0 "$pid" 2>/dev/null; do
+    if [ "$i" -ge "$1" ]; then
+        kill -KILL "-$pid" 2>/dev/null || kill -KILL "$pid"
+        exit 0
+    fi
+    i=$((i + 1))
+    sleep 0.1
+done
+kill -KILL "-$pid" 2>/dev/null
+"""
+
+
+def with_pid_file(argv: list[str], pid_file: str) -> list[str]:
+    """Wraps a command so that it writes its PID to a file before it starts.
+
+    Args:
+        argv (list[str]): The command.
+        pid_file (str): The file to write the PID to, inside the container.
+
+    Returns:
+        list[str]: A shell command that execs the original one, keeping its PID.
+    """
+    return ["sh", "-c", 'echo $$ > "$0"; exec "$@"', pid_file] + argv
+
+
+def remove_pid_file(container, pid_file: str):
+    """Removes the PID file of a command started with with_pid_file().
+
+    The command replaces the shell that wrote the file, so nothing removes it when
+    the command exits. This is called once its exit code is known.
+
+    Args:
+        container: The container the command ran in.
+        pid_file (str): The PID file of the command.
+    """
+    try:
+        container.exec_run(["rm", "-f", pid_file])
+    except Exception as e:
+        logging.warning(f"Could not remove {pid_file} from the container: {e}")
+
+
+def terminate_in_container(container, pid_file: str, kill_timeout: float):
+    """Terminates a command started with with_pid_file() in a container.
+
+    The exec API offers no way to stop a command, so its process group is
+    signalled from another exec: SIGINT first, then SIGKILL after kill_timeout.
+
+    Args:
+        container: The container running the command.
+        pid_file (str): The PID file of the command.
+        kill_timeout (float): The number of seconds to wait before SIGKILL.
+    """
+    steps = max(1, int(kill_timeout * 10))
+    container.exec_run(["sh", "-c", _TERMINATE_SCRIPT, pid_file, str(steps)])
+
+
+def terminate_process_group(process: subprocess.Popen, kill_timeout: float):
+    """Terminates a local command started in its own session, and its children.
+
+    Args:
+        process (subprocess.Popen): The command, started with
+            start_new_session=True.
+        kill_timeout (float): The number of seconds to wait before SIGKILL.
+    """
+    try:
+        os.killpg(process.pid, signal.SIGINT)
+    except ProcessLookupError:
+        return  # Already exited
+    try:
+        process.wait(kill_timeout)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        # The command, or the processes it left behind holding the output pipe
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class Job(abc.ABC):
+    """A handle to a command running in the background.
+
+    The command is started by a reader thread, once the inputs it depends on are
+    staged and, with a GPU pool, once enough GPUs are free. The thread collects its
+    output, which can be read incrementally while the command runs, and resolves
+    the future once the command exits.
+
+    Args:
+        command (list[str]): The command to execute as a list of strings.
+        output (Optional[OutputPipeline]): Stores and echoes the output. Defaults
+            to keeping all of it in memory and echoing it to stdout.
+        wait_for (Iterable[Future]): Futures to wait for before starting the
+            command, typically the staging of its inputs.
+        gpu_pool (Optional[GpuPool]): The pool to take GPUs from. The command only
+            sees these GPUs, through CUDA_VISIBLE_DEVICES.
+        num_gpus (int): The number of GPUs to take from the pool. With 0, the
+            command does not use the pool and sees every GPU.
+        on_progress (Optional[Callable[[ProgressEvent], None]]): Called from the
+            reader thread with the training progress printed by ns-train.
+        timeout (Optional[float]): The maximum number of seconds the command may
+            run before it is cancelled, or None for no limit.
+        kill_timeout (float): The number of seconds a cancelled command is given
+            to exit after SIGINT, before it is killed with SIGKILL.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        output: Optional[OutputPipeline] = None,
+        wait_for: Iterable[Future] = (),
+        gpu_pool: Optional[GpuPool] = None,
+        num_gpus: int = 1,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+        kill_timeout: float = DEFAULT_KILL_TIMEOUT,
+    ):
+        self.command = command
+        if output is None:
+            output = OutputPipeline(OutputBuffer(), TerminalEcho())
+        self._pipeline = output
+        self._output = output.buffer
+        self.on_progress = on_progress
+        self._progress: Optional[ProgressEvent] = None
+        self._progress_condition = threading.Condition()
+        output.line_callbacks.append(
+            TrainProgressParser(self._record_progress).feed_line
+        )
+        self._wait_for = list(wait_for)
+        self.gpu_pool = gpu_pool
+        self.num_gpus = num_gpus
+        self.timeout = timeout
+        self.kill_timeout = kill_timeout
+        # Whether the command was cancelled because it ran for longer than timeout
+        self.timed_out = False
+        # The GPUs assigned to the command, None without a GPU pool
+        self.devices: Optional[list[str]] = None
+        self._future: Future = Future()
+        # Guards the read position, and the start of the command against cancel()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._read_position = 0
+        self._thread = threading.Thread(
+            target=self._run, name="nsdw-job-reader", daemon=True
+        )
+        self._future.add_done_callback(lambda _: self._notify_progress())
+
+    def _start_reader(self):
+        """Starts the reader thread. Called by subclasses once initialized."""
+        self._thread.start()
+
+    def _run(self):
+        """Body of the reader thread."""
+        futures.wait(self._wait_for)
+        timer = None
+        try:
+            if self.gpu_pool is not None and self.num_gpus > 0:
+                self.devices = self.gpu_pool.acquire(
+                    self.num_gpus, cancelled=self._future.cancelled
+                )
+        except BaseException as e:
+            self._pipeline.close()
+            if self._future.set_running_or_notify_cancel():
+                self._future.set_exception(e)
+            return
+
+        try:
+            with self._start_lock:
+                if not self._future.set_running_or_notify_cancel():
+                    return
+                try:
+                    for future in self._wait_for:
+                        future.result()
+                    self._start()
+                except BaseException as e:
+                    self._future.set_exception(e)
+                    return
+                if self.timeout is not None:
+                    timer = threading.Timer(self.timeout, self._time_out)
+                    timer.daemon = True
+                    timer.start()
+
+            try:
+                for chunk in self._iter_chunks():
+                    self._pipeline.feed_bytes(chunk)
+                exit_code = self._wait()
+            except BaseException as e:
+                self._future.set_exception(e)
+                return
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._pipeline.close()
+            if self.devices is not None:
+                self.gpu_pool.release(self.devices)  # type: ignore
+
+        if exit_code != 0:
+            logging.error(f"Command execution failed with exit code {exit_code}")
+        self._future.set_result(exit_code)
+
+    def _record_progress(self, event: ProgressEvent):
+        """Stores the latest progress event. Called from the reader thread."""
+        with self._progress_condition:
+            self._progress = event
+            self._progress_condition.notify_all()
+        if self.on_progress is not None:
+            self.on_progress(event)
+
+    def _notify_progress(self):
+        """Wakes up the iter_progress() loops, e.g. once the job is done."""
+        with self._progress_condition:
+            self._progress_condition.notify_all()
+
+    def _time_out(self):
+        """Cancels the command once it has run for timeout seconds."""
+        if not self._future.done():
+            logging.warning(
+                f"Command timed out after {self.timeout} seconds: {' '.join(self.command)}"
+            )
+            self.timed_out = True
+            self.cancel()
+
+    def _environment(self) -> dict[str, str]:
+        """Returns the environment variables to set for the command."""
+        if self.devices is None:
+            return {}
+        return {"CUDA_VISIBLE_DEVICES": ",".join(self.devices)}
+
+    def _devices_info(self) -> str:
+        """Describes the GPUs of the command, for logging."""
+        if self.devices is None:
+            return ""
+        return f" (GPU {','.join(self.devices)})"
+
+    @abc.abstractmethod
+    def _start(self):
+        """Starts the command."""
+
+    @abc.abstractmethod
+    def _iter_chunks(self) -> Iterator[bytes]:
+        """Yields the raw output of the command until it exits."""
+
+    @abc.abstractmethod
+    def _wait(self) -> int:
+        """Returns the exit code of the command, once its output is consumed."""
+
+    @abc.abstractmethod
+    def _kill(self):
+        """Terminates the running command: SIGINT, then SIGKILL after kill_timeout.
+
+        Runs in its own thread, as it may wait for the command to exit.
+        """
+
+    @property
+    def future(self) -> Future:
+        """A future resolving to the exit code of the command."""
+        return self._future
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        """The exit code, or None while the command runs or if it never ran."""
+        if self._future.done() and not self._future.cancelled():
+            if self._future.exception() is None:
+                return self._future.result()
+        return None
+
+    @property
+    def output(self) -> str:
+        """The output received so far, or its tail when the output is logged."""
+        return self._output.getvalue()
+
+    @property
+    def log(self) -> Optional[CommandLog]:
+        """A handle to the full output, or None when it is only kept in memory."""
+        if self._output.log_path is None:
+            return None
+        return CommandLog(self._output.log_path, self._output.getvalue())
+
+    @property
+    def progress(self) -> Optional[ProgressEvent]:
+        """The latest training progress, or None if ns-train has printed none yet."""
+        return self._progress
+
+    def iter_progress(self) -> Iterator[ProgressEvent]:
+        """Yields the training progress as ns-train prints it, until the job ends.
+
+        Events that arrive while the caller is busy are skipped: each iteration
+        yields the latest event.
+
+        Yields:
+            ProgressEvent: The latest training progress.
+        """
+        last = None
+        while True:
+            with self._progress_condition:
+                while self._progress is last and not self._future.done():
+                    self._progress_condition.wait()
+                event = self._progress
+            if event is last:
+                return
+            last = event
+            yield event  # type: ignore
+
+    def done(self) -> bool:
+        """Returns whether the command has finished, failed or been cancelled."""
+        return self._future.done()
+
+    def poll(self) -> Optional[int]:
+        """Checks whether the command has exited, without blocking.
+
+        Returns:
+            Optional[int]: The exit code, or None if the command is still running.
+
+        Raises:
+            concurrent.futures.CancelledError: If the job was cancelled before the
+                command started.
+            Exception: Any error raised while staging the inputs or running the
+                command.
+        """
+        if not self._future.done():
+            return None
+        return self._future.result()
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """Waits for the command to exit.
+
+        Args:
+            timeout (Optional[float]): The maximum number of seconds to wait, or
+                None to wait forever.
+
+        Returns:
+            int: The exit code of the command.
+
+        Raises:
+            TimeoutError: If the command is still running after timeout seconds.
+            concurrent.futures.CancelledError: If the job was cancelled before the
+                command started.
+            Exception: Any error raised while staging the inputs or running the
+                command.
+        """
+        try:
+            return self._future.result(timeout)
+        except futures.TimeoutError:
+            if self._future.done():
+                raise
+            # Only an alias of the built-in TimeoutError from Python 3.11
+            raise TimeoutError(
+                f"Command still running after {timeout} seconds: {' '.join(self.command)}"
+            ) from None
+
+    def cancel(self) -> bool:
+        """Cancels the job.
+
+        A job that has not started yet is never started. A running command and
+        the processes it started receive SIGINT, so that it can shut down cleanly,
+        then SIGKILL if they are still running after kill_timeout seconds. The
+        exit code reflects the termination, and the GPUs of the job are released
+        once the command has exited.
+
+        Returns:
+            bool: False if the command had already finished, True otherwise.
+        """
+        with self._start_lock:
+            if self._future.cancel():
+                return True
+            if self._future.done():
+                return False
+            logging.info(f"Cancelling command: {' '.join(self.command)}")
+            threading.Thread(
+                target=self._kill, name="nsdw-job-kill", daemon=True
+            ).start()
+            return True
+
+    def read_output(self) -> str:
+        """Returns the output received since the previous call.
+
+        Returns:
+            str: The new output, possibly empty.
+        """
+        with self._lock:
+            text, self._read_position = self._output.read_from(self._read_position)
+        return text
+
+
+class LocalJob(Job):
+    """A job running on the host as a subprocess.
+
+    Args:
+        command (list[str]): The command to execute as a list of strings.
+        cwd (str): The working directory of the command.
+        output (Optional[OutputPipeline]): Stores and echoes the output.
+        wait_for (Iterable[Future]): Futures to wait for before starting.
+        gpu_pool (Optional[GpuPool]): The pool to take GPUs from.
+        num_gpus (int): The number of GPUs to take from the pool.
+        on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+            training progress printed by ns-train.
+        timeout (Optional[float]): The maximum number of seconds the command may
+            run, or None for no limit.
+        kill_timeout (float): The grace period between SIGINT and SIGKILL.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        cwd: str,
+        output: Optional[OutputPipeline] = None,
+        wait_for: Iterable[Future] = (),
+        gpu_pool: Optional[GpuPool] = None,
+        num_gpus: int = 1,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+        kill_timeout: float = DEFAULT_KILL_TIMEOUT,
+    ):
+        super().__init__(
+            command,
+            output,
+            wait_for,
+            gpu_pool,
+            num_gpus,
+            on_progress,
+            timeout,
+            kill_timeout,
+        )
+        self.cwd = cwd
+        self.process: Optional[subprocess.Popen] = None
+        self._start_reader()
+
+    def _start(self):
+        logging.info(
+            f"Executing command on host: {' '.join(self.command)}{self._devices_info()}"
+        )
+        self.process = subprocess.Popen(
+            self.command[0].split() + self.command[1:],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd,
+            env={**os.environ, **self._environment()},
+            # Own process group, so that the children of the command are signalled too
+            start_new_session=True,
+        )
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        while chunk := self.process.stdout.read1(65536):  # type: ignore
+            yield chunk
+
+    def _wait(self) -> int:
+        return self.process.wait()  # type: ignore
+
+    def _kill(self):
+        terminate_process_group(self.process, self.kill_timeout)  # type: ignore
+
+
+class DockerJob(Job):
+    """A job running in a container through the Docker exec API.
+
+    The command writes its PID to a file inside the container, so that it can be
+    signalled later: the exec API itself offers no way to stop a command.
+
+    Args:
+        command (list[str]): The command to execute as a list of strings.
+        api_client: The low-level Docker API client.
+        container: The container to run the command in.
+        workdir (str): The working directory of the command in the container.
+        output (Optional[OutputPipeline]): Stores and echoes the output.
+        wait_for (Iterable[Future]): Futures to wait for before starting.
+        gpu_pool (Optional[GpuPool]): The pool to take GPUs from.
+        num_gpus (int): The number of GPUs to take from the pool.
+        on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+            training progress printed by ns-train.
+        timeout (Optional[float]): The maximum number of seconds the command may
+            run, or None for no limit.
+        kill_timeout (float): The grace period between SIGINT and SIGKILL.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        api_client,
+        container,
+        workdir: str,
+        output: Optional[OutputPipeline] = None,
+        wait_for: Iterable[Future] = (),
+        gpu_pool: Optional[GpuPool] = None,
+        num_gpus: int = 1,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+        kill_timeout: float = DEFAULT_KILL_TIMEOUT,
+    ):
+        super().__init__(
+            command,
+            output,
+            wait_for,
+            gpu_pool,
+            num_gpus,
+            on_progress,
+            timeout,
+            kill_timeout,
+        )
+        self.api_client = api_client
+        self.container = container
+        self.workdir = workdir
+        self.pid_file = f"/tmp/nsdw-{uuid.uuid4().hex}.pid"
+        self.exec_id: Optional[str] = None
+        self._start_reader()
+
+    def _start(self):
+        full_command = " ".join(self.command)
+        logging.info(
+            f"Executing command in container: {full_command}{self._devices_info()}"
+        )
+
+        exec_instance = self.api_client.exec_create(
+            self.container.id,
+            cmd=with_pid_file(shlex.split(full_command), self.pid_file),
+            stdout=True,
+            stderr=True,
+            tty=True,
+            workdir=self.workdir,
+            environment=self._environment() or None,
+        )
+        self.exec_id = exec_instance["Id"]
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        yield from self.api_client.exec_start(self.exec_id, stream=True, tty=True)
+
+    def _wait(self) -> int:
+        exit_code = self.api_client.exec_inspect(self.exec_id)["ExitCode"]
+        remove_pid_file(self.container, self.pid_file)
+        return exit_code
+
+    def _kill(self):
+        terminate_in_container(self.container, self.pid_file, self.kill_timeout)
+
+
+class ForkServerJob(Job):
+    """A job run by the fork server, see fork_server.py.
+
+    The command is forked from a resident process that has already imported
+    Nerfstudio, instead of being started from scratch.
+
+    Args:
+        command (list[str]): The command, as given by the user, for logging.
+        argv (list[str]): The arguments of the command.
+        socket_path (str): The host path of the fork server socket.
+        cwd (str): The working directory of the command, as seen by the server.
+        output (Optional[OutputPipeline]): Stores and echoes the output.
+        wait_for (Iterable[Future]): Futures to wait for before starting.
+        gpu_pool (Optional[GpuPool]): The pool to take GPUs from.
+        num_gpus (int): The number of GPUs to take from the pool.
+        on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+            training progress printed by ns-train.
+        timeout (Optional[float]): The maximum number of seconds the command may
+            run, or None for no limit.
+        kill_timeout (float): The grace period between SIGINT and SIGKILL.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        argv: list[str],
+        socket_path: str,
+        cwd: str,
+        output: Optional[OutputPipeline] = None,
+        wait_for: Iterable[Future] = (),
+        gpu_pool: Optional[GpuPool] = None,
+        num_gpus: int = 1,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+        kill_timeout: float = DEFAULT_KILL_TIMEOUT,
+    ):
+        super().__init__(
+            command,
+            output,
+            wait_for,
+            gpu_pool,
+            num_gpus,
+            on_progress,
+            timeout,
+            kill_timeout,
+        )
+        self.argv = argv
+        self.socket_path = socket_path
+        self.cwd = cwd
+        self.connection: Optional[socket.socket] = None
+        self._exit_code: Optional[int] = None
+        self._start_reader()
+
+    def _start(self):
+        logging.info(
+            f"Executing command in fork server: {' '.join(self.command)}{self._devices_info()}"
+        )
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(self.socket_path)
+        request = {
+            "argv": self.argv,
+            "cwd": self.cwd,
+            "env": self._environment(),
+            "kill_timeout": self.kill_timeout,
+        }
+        self.connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        with self.connection.makefile("rb") as reader:  # type: ignore
+            while header := reader.read(FRAME_HEADER.size):
+                frame_type, size = FRAME_HEADER.unpack(header)
+                payload = reader.read(size)
+                if frame_type == b"X":
+                    self._exit_code = int(payload)
+                    break
+                yield payload
+        self.connection.close()  # type: ignore
+        if self._exit_code is None:
+            raise ConnectionError("The fork server closed the connection.")
+
+    def _wait(self) -> int:
+        return self._exit_code  # type: ignore
+
+    def _kill(self):
+        # The server terminates the command when the connection is half-closed
+        try:
+            self.connection.shutdown(socket.SHUT_WR)  # type: ignore
+        except OSError:
+            pass  # The command has just exited
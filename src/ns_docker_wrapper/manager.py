@@ -1,56 +1,192 @@
+import asyncio
 import atexit
+import hashlib
+import json
 import logging
 import os
+import shlex
 import shutil
+import signal
+import socket
 import subprocess
 import sys
 import tempfile
-from typing import Optional
+import threading
+import time
+import uuid
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Optional, Sequence, Union
 
 import docker
 
+from . import fork_server, staging
+from .gpus import GpuPool, detect_gpus
+from .jobs import (
+    DEFAULT_KILL_TIMEOUT,
+    DockerJob,
+    ForkServerJob,
+    Job,
+    LocalJob,
+    remove_pid_file,
+    terminate_in_container,
+    with_pid_file,
+)
+from .output import (
+    CommandLog,
+    OutputBuffer,
+    OutputPipeline,
+    TerminalEcho,
+    log_file_path,
+)
+from .progress import ProgressEvent, TrainProgressParser
+from .results import RunIndex
+from .transforms import ImageTransform
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+STAGING_MODES = ("copy", "mount", "cache", "sync", "archive")
+
 
 class DockerManager:
-    """A singleton class to manage the Docker container for Nerfstudio.
+    """A class to manage the Docker container for Nerfstudio.
     This class handles the lifecycle of the Docker container, including pulling the
     image, starting the container, executing commands, and cleaning up resources.
+    Managers are independent: a process can use several of them, e.g. with
+    different images or output directories, and share each one between threads.
     """
 
-    _instance = None
-
-    def __new__(cls, *args, **kwargs):
-        if not cls._instance:
-            cls._instance = super(DockerManager, cls).__new__(cls)
-        return cls._instance
-
     def __init__(
         self,
         output_base_path: str,
         image_name: Optional[str] = "ghcr.io/nerfstudio-project/nerfstudio:latest",
         ipc: str = "host",
+        staging_mode: str = "copy",
+        allow_hardlinks: bool = False,
+        staging_cache_size: Optional[int] = None,
+        sync_checksum: bool = False,
+        copy_workers: Optional[int] = None,
+        background_staging: bool = True,
+        archive_compression: Optional[str] = None,
+        gpus: Optional[Union[int, Sequence[Union[int, str]], str, GpuPool]] = None,
+        viewer_port: Optional[int] = None,
+        use_fork_server: bool = False,
+        output_tail_size: Optional[int] = None,
+        log_dir: Optional[str] = None,
+        collapse_progress: bool = True,
+        echo_interval: float = 0.1,
+        kill_timeout: float = DEFAULT_KILL_TIMEOUT,
+        mounts: Optional[Iterable[str]] = None,
     ):
         """Initializes the DockerManager.
         Args:
             output_base_path (str): The base path for the output data.
             image_name (Optional[str]): The name of the Docker image to use. If None, commands are run on the host.
             ipc (str): The IPC mode to use for the container.
+            staging_mode (str): The default strategy used to expose nsdw.path() inputs,
+                one of "copy", "mount", "cache", "sync" or "archive".
+            allow_hardlinks (bool): Whether copied inputs may be hard links to their
+                source when reflinks are not supported. Staged files must then be
+                treated as read-only.
+            staging_cache_size (Optional[int]): The size budget in bytes of the
+                persistent staging cache used by the "cache" mode. None means no limit.
+            sync_checksum (bool): Whether the "sync" mode also compares file hashes
+                to detect changes, instead of only sizes and modification times.
+            copy_workers (Optional[int]): The number of threads used to copy
+                directories. None uses the ThreadPoolExecutor default.
+            background_staging (bool): Whether the inputs of a command are staged
+                in the background once it runs, instead of blocking until each copy
+                is done.
+                Command.run() waits for them before executing.
+            archive_compression (Optional[str]): The compression of the tar stream
+                used by the "archive" mode: None, "gzip" or "zstd".
+            gpus (Optional[Union[int, Sequence[Union[int, str]], str, GpuPool]]):
+                The GPUs to schedule commands on, as a number of GPUs, a list of
+                device IDs or "auto" to use every GPU listed by nvidia-smi. Each
+                command is then pinned to its own GPUs and waits for them to be free.
+                A GpuPool can be shared by several managers. None lets every command
+                see all GPUs.
+            viewer_port (Optional[int]): The host port the viewer (port 7007 in the
+                container) is published on, or None to not publish it, so that
+                several managers can run side by side. nsdw.init() publishes it on
+                7007. Use a different port for each manager publishing it.
+            use_fork_server (bool): Whether commands are run by a resident fork
+                server that has already imported Nerfstudio, which saves the Python
+                startup time of each command. The server is reached through a Unix
+                socket on the temporary volume, so the Docker daemon must run on
+                this machine. Commands are executed normally until it is ready.
+            output_tail_size (Optional[int]): If set, only the last output_tail_size
+                characters of the output of each command are kept in memory, and the
+                full output is written to a log file. Commands then return a
+                CommandLog instead of a string. None keeps all the output in memory.
+            log_dir (Optional[str]): The directory of the log files, defaults to
+                output_base_path/logs.
+            collapse_progress (bool): Whether the carriage-return redraws of progress
+                bars are collapsed to their latest state, in both the stored and the
+                echoed output.
+            echo_interval (float): The minimum time in seconds between two writes of
+                command output to stdout.
+            kill_timeout (float): The number of seconds a cancelled or timed out
+                command is given to exit after SIGINT, before its process group is
+                killed with SIGKILL.
+            mounts (Optional[Iterable[str]]): Local directories bind-mounted
+                read-only when the container starts. Inputs staged in "mount" mode
+                inside them are used without recreating the container.
+        Raises:
+            RuntimeError: If the container cannot be started, e.g. because the
+                viewer port is already in use.
         """
 
         os.makedirs(output_base_path, exist_ok=True)
 
-        if hasattr(self, "_initialized") and self._initialized:
-            return
-
         self.image_name = image_name
         self.use_docker = self.image_name is not None
         self.container = None
         self.output_base_path = os.path.abspath(output_base_path)
         self.ipc = ipc
-        self._initialized = True
+        self.viewer_port = viewer_port
+        self.use_fork_server = use_fork_server
+        self.output_tail_size = output_tail_size
+        self.log_dir = log_dir or os.path.join(self.output_base_path, "logs")
+        self.collapse_progress = collapse_progress
+        self.echo_interval = echo_interval
+        self.kill_timeout = kill_timeout
+        self._fork_server_process: Optional[subprocess.Popen] = None
+        # Guards the replacement of the container when new mounts are added
+        self._container_lock = threading.RLock()
+        # Commands holding a reference to the current container, see _hold_container()
+        self._running_commands = 0
+        self._closed = False
+        self.staging_mode = self._check_staging_mode(staging_mode)
+        # Host source path -> container path of read-only bind mounts
+        self._mounts: dict[str, str] = {}
+        self.allow_hardlinks = allow_hardlinks
+        self.copy_workers = copy_workers
+        self.background_staging = background_staging
+        if archive_compression not in staging.ARCHIVE_COMPRESSIONS:
+            raise ValueError(
+                f"Unknown archive compression '{archive_compression}'. Expected one of {staging.ARCHIVE_COMPRESSIONS}."
+            )
+        self.archive_compression = archive_compression
+        self._staging_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="nsdw-staging"
+        )
+        # (mode, source path) -> (container path, future) of the staged sources
+        self._staged: dict[tuple[str, str], tuple[str, Future]] = {}
+        # Future -> copy of the staged sources waiting for start_staging()
+        self._deferred_staging: dict[Future, Callable[[], None]] = {}
+        self._staging_lock = threading.Lock()
+        # Strategy used for each file of the last copy, see staging.copy_file()
+        self.last_staging_report = staging.StagingReport()
+        self.staging_cache = staging.StagingCache(
+            os.path.join(self.output_base_path, ".cache", "staging"),
+            max_size=staging_cache_size,
+        )
+        self.sync_checksum = sync_checksum
+        # Successful runs of memoized commands, see Command.run(memoize=True)
+        self.run_index = RunIndex(os.path.join(self.output_base_path, ".cache", "runs"))
 
         # Temporary directory for internal data processing (mounted to /ns_temp_data)
         temp_dir_base = os.path.join(self.output_base_path, ".tmp")
@@ -72,6 +208,11 @@ class DockerManager:
 
             self.workspace_path = "/workspace"
             self.internal_temp_data_container_path = "/ns_temp_data"
+            self.mounts_container_path = "/ns_mounts"
+            self.archive_container_path = "/ns_archive_data"
+            for mount in mounts or ():
+                src_path = os.path.abspath(mount)
+                self._mounts[src_path] = self._mount_container_path(src_path)
             self._pull_image_if_needed()
             self._start_container()
         else:
@@ -81,9 +222,41 @@ class DockerManager:
             self.internal_temp_data_container_path = (
                 self._internal_temp_data_host_path.name
             )
+            self.mounts_container_path = None
+            self.archive_container_path = None
+            if self.use_fork_server:
+                self._start_fork_server()
+
+        self.gpu_pool = self._create_gpu_pool(gpus)
 
         atexit.register(self.cleanup)
 
+    def _create_gpu_pool(
+        self, gpus: Optional[Union[int, Sequence[Union[int, str]], str, GpuPool]]
+    ) -> Optional[GpuPool]:
+        """Creates the pool of GPUs that commands are scheduled on.
+        Args:
+            gpus (Optional[Union[int, Sequence[Union[int, str]], str, GpuPool]]):
+                The GPUs, see __init__().
+        Returns:
+            Optional[GpuPool]: The pool, or None to disable GPU scheduling.
+        """
+        if gpus is None or isinstance(gpus, GpuPool):
+            return gpus
+        if gpus == "auto":
+            if self.use_docker:
+                gpus = detect_gpus(
+                    lambda command: tuple(self.container.exec_run(command))  # type: ignore
+                )
+            else:
+                gpus = detect_gpus()
+            if not gpus:
+                logging.warning("No GPU found, commands will not be pinned to GPUs.")
+                return None
+        pool = GpuPool(gpus)  # type: ignore
+        logging.info(f"Scheduling commands on GPUs {', '.join(pool.devices)}.")
+        return pool
+
     def _pull_image_if_needed(self):
         """Pulls the Docker image if it is not already present."""
 
@@ -105,6 +278,8 @@ class DockerManager:
                 "mode": "rw",
             },
         }
+        for host_path, container_path in self._mounts.items():
+            volumes[host_path] = {"bind": container_path, "mode": "ro"}
 
         device_requests = [docker.types.DeviceRequest(count=-1, capabilities=[["gpu"]])]
 
@@ -116,7 +291,7 @@ class DockerManager:
                 stdin_open=True,
                 device_requests=device_requests,
                 volumes=volumes,
-                ports={"7007/tcp": 7007},
+                ports={"7007/tcp": self.viewer_port} if self.viewer_port else {},
                 ipc_mode=self.ipc,
                 remove=True,
                 user=f"{os.getuid()}" if hasattr(os, "getuid") else None,
@@ -131,13 +306,174 @@ class DockerManager:
             )
             logging.info(f"Container {self.container.short_id} started.")
         except Exception as e:
-            logging.error(f"Failed to start container: {e}")
-            sys.exit(1)
+            raise RuntimeError(f"Failed to start container: {e}") from e
+
+        if self.use_fork_server:
+            self._start_fork_server()
+
+    def _start_fork_server(self):
+        """Starts the fork server (see fork_server.py) in the background.
+
+        The server and its socket live in the .fork_server directory of the
+        temporary volume. The socket only appears once the server has imported
+        Nerfstudio, see _fork_server_socket().
+        """
+        host_dir = os.path.join(self._internal_temp_data_host_path.name, ".fork_server")
+        os.makedirs(host_dir, exist_ok=True)
+        socket_path = os.path.join(host_dir, "server.sock")
+        # AF_UNIX paths are limited to 108 bytes on Linux
+        if len(os.fsencode(socket_path)) >= 108:
+            logging.warning(
+                f"The fork server socket path is too long, disabling the fork server: {socket_path}"
+            )
+            self.use_fork_server = False
+            return
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Left by the server of a previous container
+        shutil.copy(fork_server.__file__, os.path.join(host_dir, "fork_server.py"))
+
+        logging.info("Starting the fork server...")
+        if self.use_docker:
+            server_dir = f"{self.internal_temp_data_container_path}/.fork_server"
+            self.container.exec_run(  # type: ignore
+                [
+                    "sh",
+                    "-c",
+                    'exec python "$0/fork_server.py" "$0/server.sock" > "$0/server.log" 2>&1',
+                    server_dir,
+                ],
+                detach=True,
+            )
+        else:
+            with open(os.path.join(host_dir, "server.log"), "wb") as log_file:
+                self._fork_server_process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        os.path.join(host_dir, "fork_server.py"),
+                        socket_path,
+                    ],
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    cwd=self.output_base_path,
+                )
+
+    def _fork_server_socket(self) -> Optional[str]:
+        """Returns the host path of the fork server socket, or None if not ready.
+
+        The server is probed with a connection, so that commands fall back to a
+        normal execution if it has died and left its socket behind.
+        """
+        if not self.use_fork_server:
+            return None
+        socket_path = os.path.join(
+            self._internal_temp_data_host_path.name, ".fork_server", "server.sock"
+        )
+        if not os.path.exists(socket_path):
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+        except OSError as e:
+            logging.warning(
+                f"The fork server is not responding ({e}), running commands normally."
+            )
+            try:
+                os.unlink(socket_path)  # Recreated when the container is restarted
+            except FileNotFoundError:
+                pass
+            return None
+        return socket_path
+
+    def _hold_container(self):
+        """Returns the container for a command to run in, and marks it as used.
+
+        The container is not recreated until the command calls
+        _release_container().
+
+        Raises:
+            RuntimeError: If the container is not running.
+        """
+        with self._container_lock:
+            if not self.container:
+                raise RuntimeError(
+                    "Container is not running. Please call init() first."
+                )
+            self._running_commands += 1
+            return self.container
+
+    def _release_container(self):
+        """Marks a command started with _hold_container() as finished."""
+        with self._container_lock:
+            self._running_commands -= 1
+
+    def _restart_container(self):
+        """Recreates the container so that its volume list is up to date.
+
+        Data streamed by the "archive" mode lives in the container filesystem, so
+        it is forgotten and staged again when needed. Must be called with the
+        staging lock held.
+
+        Raises:
+            RuntimeError: If commands are running in the container, or data is
+                being streamed into it: recreating it would kill them.
+        """
+
+        with self._container_lock:
+            archiving = any(
+                key[0] == "archive" and not future.done()
+                for key, (_, future) in self._staged.items()
+            )
+            if self._running_commands or archiving:
+                raise RuntimeError(
+                    "Cannot add a mount while commands are running in the container, "
+                    "as it has to be recreated. Wait for them to finish, or declare "
+                    "the directory with the mounts argument of nsdw.init()."
+                )
+            self._staged = {
+                key: staged
+                for key, staged in self._staged.items()
+                if key[0] != "archive"
+            }
+            if self.container:
+                logging.info(
+                    f"Recreating container {self.container.short_id} to add new mounts..."
+                )
+                try:
+                    self.container.stop()
+                except docker.errors.NotFound:
+                    pass
+                self.container = None
+            self._start_container()
+
+    def __enter__(self) -> "DockerManager":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
 
     def cleanup(self):
-        """Cleans up the resources used by the DockerManager."""
+        """Cleans up the resources used by the DockerManager.
+
+        The manager cannot be used afterwards. Calling this more than once has no
+        effect.
+        """
+
+        with self._container_lock:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.cleanup)
 
         logging.info("Cleaning up resources...")
+        self._staging_executor.shutdown(wait=True, cancel_futures=True)
+        with self._staging_lock:
+            for future in self._deferred_staging:
+                future.cancel()
+            self._deferred_staging.clear()
+        self.staging_cache.release()
+        if self._fork_server_process is not None:
+            self._fork_server_process.terminate()
+            self._fork_server_process.wait()
         if self.use_docker and self.container:
             logging.info(f"Stopping container {self.container.short_id}...")
             try:
@@ -154,83 +490,610 @@ class DockerManager:
             f"Removed internal temporary data directory: {self._internal_temp_data_host_path.name}"
         )
 
-    def execute_command(self, command: list[str]) -> tuple[int, str]:
+    def execute_command(
+        self,
+        command: list[str],
+        num_gpus: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> tuple[int, Union[str, CommandLog]]:
         """Executes a command in the Docker container or on the host.
+
+        If the command times out or the caller is interrupted (e.g. Ctrl-C), the
+        command is terminated, see Job.cancel().
+        Args:
+            command (list[str]): The command to execute as a list of strings.
+            num_gpus (Optional[int]): The number of GPUs to pin the command to when
+                a GPU pool is configured. Defaults to 1. With 0, the command does
+                not wait for GPUs and sees all of them, e.g. for CPU-bound steps.
+            on_line (Optional[Callable[[str], None]]): Called with each complete line
+                of output, from the thread reading the output.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+                training progress printed by ns-train, from the same thread.
+            timeout (Optional[float]): The maximum number of seconds the command may
+                run, or None for no limit.
+        Returns:
+            tuple[int, Union[str, CommandLog]]: A tuple containing the exit code and
+                the command output, or a handle to its log when output_tail_size is
+                set.
+        Raises:
+            TimeoutError: If the command ran for longer than timeout seconds.
+        """
+        job = self.start_command(
+            command,
+            num_gpus=num_gpus,
+            on_line=on_line,
+            on_progress=on_progress,
+            timeout=timeout,
+        )
+        try:
+            exit_code = job.wait()
+        except KeyboardInterrupt:
+            job.cancel()
+            # Give the command time to exit, so that its GPUs are released
+            futures.wait([job.future], timeout=self.kill_timeout + 5)
+            raise
+        if job.timed_out:
+            raise TimeoutError(
+                f"Command timed out after {timeout} seconds: {' '.join(command)}"
+            )
+        return exit_code, job.log or job.output
+
+    def _new_output(
+        self,
+        command: list[str],
+        echo: Optional[Union[bool, Callable[[str], None]]] = True,
+        on_line: Optional[Callable[[str], None]] = None,
+    ) -> OutputPipeline:
+        """Creates the pipeline storing and echoing the output of a command.
+        Args:
+            command (list[str]): The command.
+            echo (Optional[Union[bool, Callable[[str], None]]]): Whether the output
+                is echoed to stdout, or a callable receiving the output instead.
+            on_line (Optional[Callable[[str], None]]): Called with each complete line
+                of output.
+        Returns:
+            OutputPipeline: A pipeline keeping all the output in memory, or its tail
+                and a log file when output_tail_size is set.
+        """
+        if self.output_tail_size is None:
+            buffer = OutputBuffer()
+        else:
+            buffer = OutputBuffer(
+                self.output_tail_size, log_file_path(self.log_dir, command)
+            )
+        if echo is True:
+            echo = TerminalEcho(min_interval=self.echo_interval)
+        return OutputPipeline(
+            buffer,
+            echo or None,
+            collapse_progress=self.collapse_progress,
+            line_callbacks=[on_line] if on_line is not None else [],
+        )
+
+    def start_command(
+        self,
+        command: list[str],
+        echo: bool = True,
+        wait_for: Iterable[Future] = (),
+        num_gpus: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Job:
+        """Starts a command in the background and returns a handle to it.
         Args:
             command (list[str]): The command to execute as a list of strings.
+            echo (bool): Whether the output is also written to stdout.
+            wait_for (Iterable[Future]): Futures to wait for before starting the
+                command, e.g. the staging of its inputs.
+            num_gpus (Optional[int]): The number of GPUs to pin the command to when
+                a GPU pool is configured. Defaults to 1. With 0, the command does
+                not wait for GPUs and sees all of them, e.g. for CPU-bound steps.
+            on_line (Optional[Callable[[str], None]]): Called with each complete line
+                of output, from the thread reading the output.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+                training progress printed by ns-train, from the same thread.
+            timeout (Optional[float]): The maximum number of seconds the command may
+                run before it is cancelled, or None for no limit.
         Returns:
-            tuple[int, str]: A tuple containing the exit code and the command output.
+            Job: A handle to poll, wait for, cancel or read the command.
         """
+        job_options = {
+            "output": self._new_output(command, echo, on_line),
+            "wait_for": wait_for,
+            "gpu_pool": self.gpu_pool,
+            "num_gpus": 1 if num_gpus is None else num_gpus,
+            "on_progress": on_progress,
+            "timeout": timeout,
+            "kill_timeout": self.kill_timeout,
+        }
         if not self.use_docker:
-            logging.info(f"Executing command on host: {' '.join(command)}")
-            process = subprocess.Popen(
-                command[0].split() + command[1:],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                cwd=self.output_base_path,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
+            socket_path = self._fork_server_socket()
+            if socket_path is not None:
+                argv = command[0].split() + command[1:]
+                return ForkServerJob(
+                    command, argv, socket_path, self.workspace_path, **job_options
+                )
+            return LocalJob(command, self.output_base_path, **job_options)
+
+        container = self._hold_container()
+        try:
+            socket_path = self._fork_server_socket()
+            if socket_path is not None:
+                job: Job = ForkServerJob(
+                    command,
+                    shlex.split(" ".join(command)),
+                    socket_path,
+                    self.workspace_path,
+                    **job_options,
+                )
+            else:
+                job = DockerJob(
+                    command,
+                    self.client.api,
+                    container,
+                    self.workspace_path,
+                    **job_options,
+                )
+        except BaseException:
+            self._release_container()
+            raise
+        job.future.add_done_callback(lambda _: self._release_container())
+        return job
+
+    async def execute_command_async(
+        self,
+        command: list[str],
+        on_output: Optional[Callable[[str], None]] = None,
+        num_gpus: Optional[int] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> tuple[int, Union[str, CommandLog]]:
+        """Executes a command without blocking the event loop.
+
+        In local mode the command is started with asyncio.create_subprocess_exec().
+        In Docker mode the exec stream is read by a dedicated thread, so many
+        commands can run concurrently from a single event loop. Once the fork server
+        is ready, commands are forked from it instead. If the command times out or
+        the task is cancelled, the command is terminated like with Job.cancel().
+        Args:
+            command (list[str]): The command to execute as a list of strings.
+            on_output (Optional[Callable[[str], None]]): Called from the event loop
+                with the output, line by line when progress redraws are collapsed.
+                Defaults to echoing to stdout.
+            num_gpus (Optional[int]): The number of GPUs to pin the command to when
+                a GPU pool is configured. Defaults to 1. With 0, the command does
+                not wait for GPUs and sees all of them, e.g. for CPU-bound steps.
+            on_line (Optional[Callable[[str], None]]): Called from the event loop with
+                each complete line of output.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called from the
+                event loop with the training progress printed by ns-train.
+            timeout (Optional[float]): The maximum number of seconds the command may
+                run, or None for no limit.
+        Returns:
+            tuple[int, Union[str, CommandLog]]: A tuple containing the exit code and
+                the command output, or a handle to its log when output_tail_size is
+                set.
+        Raises:
+            TimeoutError: If the command ran for longer than timeout seconds.
+        """
+        output = self._new_output(command, on_output or True, on_line)
+        if on_progress is not None:
+            output.line_callbacks.append(TrainProgressParser(on_progress).feed_line)
+
+        environment = {}
+        devices = None
+        num_gpus = 1 if num_gpus is None else num_gpus
+        if self.gpu_pool is not None and num_gpus > 0:
+            devices = await self.gpu_pool.acquire_async(num_gpus)
+            environment["CUDA_VISIBLE_DEVICES"] = ",".join(devices)
+
+        socket_path = self._fork_server_socket()
+        if socket_path is not None:
+            execution = self._execute_in_fork_server_async(
+                command, socket_path, environment, output.feed_bytes
             )
+        elif not self.use_docker:
+            execution = self._execute_on_host_async(
+                command, environment, output.feed_bytes
+            )
+        else:
+            execution = self._execute_in_container_async(
+                command, environment, output.feed_bytes
+            )
+        try:
+            exit_code = await asyncio.wait_for(execution, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"Command timed out after {timeout} seconds: {' '.join(command)}"
+            ) from None
+        finally:
+            if devices is not None:
+                self.gpu_pool.release(devices)  # type: ignore
+            output.close()
 
-            output_chunks = []
-            if process.stdout:
-                for line in iter(process.stdout.readline, ""):
-                    sys.stdout.write(line)
-                    sys.stdout.flush()
-                    output_chunks.append(line)
+        if exit_code != 0:
+            logging.error(f"Command execution failed with exit code {exit_code}")
 
-            process.wait()
-            output = "".join(output_chunks)
-            exit_code = process.returncode
+        return exit_code, output.buffer.result()
 
-            if exit_code != 0:
-                logging.error(f"Command execution failed with exit code {exit_code}")
+    async def _execute_on_host_async(
+        self,
+        command: list[str],
+        environment: dict[str, str],
+        handle_chunk: Callable[[bytes], None],
+    ) -> int:
+        """Runs a command as an asyncio subprocess, see execute_command_async()."""
+        logging.info(f"Executing command on host: {' '.join(command)}")
+        process = await asyncio.create_subprocess_exec(
+            *(command[0].split() + command[1:]),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=self.output_base_path,
+            env={**os.environ, **environment},
+            start_new_session=True,
+        )
+        try:
+            while chunk := await process.stdout.read(65536):  # type: ignore
+                handle_chunk(chunk)
+            return await process.wait()
+        except asyncio.CancelledError:
+            logging.info(f"Cancelling command: {' '.join(command)}")
+            try:
+                os.killpg(process.pid, signal.SIGINT)
+                try:
+                    await asyncio.wait_for(process.wait(), self.kill_timeout)
+                except asyncio.TimeoutError:
+                    pass
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+            raise
 
-            return exit_code, output
+    async def _execute_in_fork_server_async(
+        self,
+        command: list[str],
+        socket_path: str,
+        environment: dict[str, str],
+        handle_chunk: Callable[[bytes], None],
+    ) -> int:
+        """Runs a command in the fork server, see execute_command_async()."""
+        if self.use_docker:
+            argv = shlex.split(" ".join(command))
+            self._hold_container()
+        else:
+            argv = command[0].split() + command[1:]
+        try:
+            logging.info(f"Executing command in fork server: {' '.join(command)}")
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            try:
+                request = {
+                    "argv": argv,
+                    "cwd": self.workspace_path,
+                    "env": environment,
+                    "kill_timeout": self.kill_timeout,
+                }
+                writer.write(json.dumps(request).encode("utf-8") + b"\n")
+                await writer.drain()
+                try:
+                    return await _read_fork_server_frames(reader, handle_chunk)
+                except asyncio.CancelledError:
+                    logging.info(f"Cancelling command: {' '.join(command)}")
+                    # The server terminates the command when the connection is
+                    # half-closed, and still reports its exit code
+                    writer.write_eof()
+                    try:
+                        await _read_fork_server_frames(reader, handle_chunk)
+                    except ConnectionError:
+                        pass
+                    raise
+            finally:
+                writer.close()
+        finally:
+            if self.use_docker:
+                self._release_container()
 
-        if not self.container:
-            raise RuntimeError("Container is not running. Please call init() first.")
+    async def _execute_in_container_async(
+        self,
+        command: list[str],
+        environment: dict[str, str],
+        handle_chunk: Callable[[bytes], None],
+    ) -> int:
+        """Runs a command with the Docker exec API, see execute_command_async()."""
+        container = self._hold_container()
+        try:
+            return await self._exec_in_container_async(
+                container, command, environment, handle_chunk
+            )
+        finally:
+            self._release_container()
 
+    async def _exec_in_container_async(
+        self,
+        container,
+        command: list[str],
+        environment: dict[str, str],
+        handle_chunk: Callable[[bytes], None],
+    ) -> int:
+        """Runs a command in a container held by _execute_in_container_async()."""
         full_command = " ".join(command)
         logging.info(f"Executing command in container: {full_command}")
 
-        exec_instance = self.client.api.exec_create(
-            self.container.id,
-            cmd=full_command,
+        pid_file = f"/tmp/nsdw-{uuid.uuid4().hex}.pid"
+        exec_instance = await asyncio.to_thread(
+            self.client.api.exec_create,
+            container.id,
+            cmd=with_pid_file(shlex.split(full_command), pid_file),
             stdout=True,
             stderr=True,
             tty=True,
             workdir=self.workspace_path,
+            environment=environment or None,
         )
         exec_id = exec_instance["Id"]
 
-        output_stream = self.client.api.exec_start(exec_id, stream=True, tty=True)
+        try:
+            async for chunk in _stream_in_thread(
+                lambda: self.client.api.exec_start(exec_id, stream=True, tty=True)
+            ):
+                handle_chunk(chunk)
+        except asyncio.CancelledError:
+            logging.info(f"Cancelling command: {full_command}")
+            await asyncio.to_thread(
+                terminate_in_container, container, pid_file, self.kill_timeout
+            )
+            raise
+
+        exec_result = await asyncio.to_thread(self.client.api.exec_inspect, exec_id)
+        await asyncio.to_thread(remove_pid_file, container, pid_file)
+        return exec_result["ExitCode"]
 
-        output_chunks = []
-        for chunk in output_stream:
-            decoded_chunk = chunk.decode("utf-8", errors="replace")
-            sys.stdout.write(decoded_chunk)
-            sys.stdout.flush()
-            output_chunks.append(decoded_chunk)
+    @staticmethod
+    def _check_staging_mode(mode: str) -> str:
+        """Validates a staging mode name.
+        Args:
+            mode (str): The staging mode to validate.
+        Returns:
+            str: The validated staging mode.
+        Raises:
+            ValueError: If the staging mode is unknown.
+        """
+        if mode not in STAGING_MODES:
+            raise ValueError(
+                f"Unknown staging mode '{mode}'. Expected one of {', '.join(STAGING_MODES)}."
+            )
+        return mode
 
-        output = "".join(output_chunks)
+    def stage_path(
+        self,
+        local_path: str,
+        copy_depth: int = 0,
+        mode: Optional[str] = None,
+        file_filter: Optional[staging.FileFilter] = None,
+        transform: Optional[ImageTransform] = None,
+    ) -> str:
+        """Makes a local file or directory available to Nerfstudio.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include.
+            mode (Optional[str]): The staging mode to use. Defaults to the manager's
+                staging_mode.
+            file_filter (Optional[staging.FileFilter]): Selects the files of a
+                directory to stage. Not supported by the "mount" mode.
+            transform (Optional[ImageTransform]): Resizes the images while they are
+                staged. Only supported by the "copy", "cache" and "archive" modes.
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        container_path, future = self._stage(
+            local_path, copy_depth, mode, file_filter, transform, False
+        )
+        future.result()
+        return container_path
 
-        exec_result = self.client.api.exec_inspect(exec_id)
-        exit_code = exec_result["ExitCode"]
+    def stage_path_in_background(
+        self,
+        local_path: str,
+        copy_depth: int = 0,
+        mode: Optional[str] = None,
+        file_filter: Optional[staging.FileFilter] = None,
+        transform: Optional[ImageTransform] = None,
+        defer: bool = False,
+    ) -> tuple[str, Future]:
+        """Starts staging a local file or directory without waiting for the copy.
 
-        if exit_code != 0:
-            logging.error(f"Command execution failed with exit code {exit_code}")
+        The container path is known right away, so the command can be built while
+        the data is copied by a background thread. If background_staging is
+        disabled, the copy is done before returning.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include.
+            mode (Optional[str]): The staging mode to use. Defaults to the manager's
+                staging_mode.
+            file_filter (Optional[staging.FileFilter]): Selects the files of a
+                directory to stage. Not supported by the "mount" mode.
+            transform (Optional[ImageTransform]): Resizes the images while they are
+                staged. Only supported by the "copy", "cache" and "archive" modes.
+            defer (bool): Whether the copy only starts once start_staging() is
+                called with the returned future.
+        Returns:
+            tuple[str, Future]: The path inside the container, and a future that
+                completes once the data is staged.
+        """
+        return self._stage(
+            local_path,
+            copy_depth,
+            mode,
+            file_filter,
+            transform,
+            self.background_staging,
+            defer,
+        )
 
-        return exit_code, output
+    def start_staging(self, futures: Sequence[Future]):
+        """Starts the copies deferred by stage_path_in_background().
 
-    def copy_to_ns_temp_data(self, local_path: str, copy_depth: int = 0) -> str:
-        """Copies a local file or directory to the internal temporary data volume.
+        Futures that were not deferred, or whose copy already started, are ignored.
+        Args:
+            futures (Sequence[Future]): The futures returned for the staged paths.
+        """
+        with self._staging_lock:
+            pending = [
+                (future, self._deferred_staging.pop(future))
+                for future in futures
+                if future in self._deferred_staging
+            ]
+        for future, work in pending:
+            if self.background_staging:
+                self._staging_executor.submit(_run_into, future, work)
+            else:
+                _run_into(future, work)
+
+    def _stage(
+        self,
+        local_path: str,
+        copy_depth: int,
+        mode: Optional[str],
+        file_filter: Optional[staging.FileFilter],
+        transform: Optional[ImageTransform],
+        background: bool,
+        defer: bool = False,
+    ) -> tuple[str, Future]:
+        """Stages a local path, reusing the result if its source was already staged.
+
+        Each source is staged at most once per session, mode and filter: staging
+        the same source again, or a path inside an unfiltered staged directory,
+        returns the same future.
         Args:
             local_path (str): The path to the local file or directory.
-            copy_depth (int): The number of parent directories to include in the copy.
+            copy_depth (int): The number of parent directories to include.
+            mode (Optional[str]): The staging mode to use, or None for the default.
+            file_filter (Optional[staging.FileFilter]): Selects the files to stage.
+            transform (Optional[ImageTransform]): Resizes the staged images.
+            background (bool): Whether to run the copy in a background thread.
+            defer (bool): Whether the copy waits for start_staging().
         Returns:
-            str: The path of the file or directory inside the container.
+            tuple[str, Future]: The path inside the container, and a future that
+                completes once the data is staged.
+        """
+        mode = self._check_staging_mode(mode or self.staging_mode)
+        if mode == "archive" and not self.use_docker:
+            # Without a container there is nothing to stream to
+            mode = "copy"
+        file_filter = file_filter or staging.FileFilter()
+        if mode == "mount" and file_filter != staging.FileFilter():
+            raise ValueError(
+                "Filters cannot be applied to mounted paths. Use another staging mode."
+            )
+        if transform is not None and mode not in ("copy", "cache", "archive"):
+            raise ValueError(
+                f'Image transforms are not supported by the "{mode}" staging mode.'
+            )
+        abs_local_path, src_path = self._resolve_source(local_path, copy_depth)
+
+        # If path is already in the main output volume, just calculate container path
+        if src_path.startswith(self.output_base_path):
+            return self._to_workspace_path(abs_local_path), _done_future()
+
+        if not os.path.exists(src_path):
+            # If path doesn't exist, return it as is, assuming it's not a path
+            return local_path, _done_future()
+
+        key = (mode, src_path, file_filter.key(), transform and transform.key())
+        with self._staging_lock:
+            staged_src_path, staged = self._find_staged(key)
+            if staged is None or _failed(staged[1]):
+                staged_src_path = src_path
+                container_src_path, work = self._plan_staging(
+                    src_path, mode, file_filter, transform
+                )
+                if work is None:
+                    future = _done_future()
+                elif defer:
+                    future = Future()
+                    self._deferred_staging[future] = work
+                elif background:
+                    future = self._staging_executor.submit(work)
+                else:
+                    future = _run_now(work)
+                staged = (container_src_path, future)
+                self._staged[key] = staged
+            else:
+                logging.info(f"{src_path} is already staged ({mode}).")
+
+        container_src_path, future = staged
+        if not defer:
+            # The source may have been staged by a command that has not run yet
+            self.start_staging([future])
+        relative_path_from_src = os.path.relpath(abs_local_path, start=staged_src_path)
+        final_path = os.path.join(container_src_path, relative_path_from_src)
+        return os.path.normpath(final_path), future
+
+    def _find_staged(self, key: tuple) -> tuple[str, Optional[tuple[str, Future]]]:
+        """Looks up the staged source that covers a source.
+
+        Without a filter, a source inside a directory that was staged the same way
+        is served from that directory. With a filter, only the exact source is
+        reused, since the patterns are relative to the staged directory.
+        Args:
+            key (tuple): The mode, source path, filter key and transform key.
+        Returns:
+            tuple[str, Optional[tuple[str, Future]]]: The staged source path, and
+                its container path and future, or None if nothing covers it.
+        """
+        mode, src_path, filter_key, transform_key = key
+        staged = self._staged.get(key)
+        if staged is not None or filter_key:
+            return src_path, staged
+        for (staged_mode, staged_path, *options), staged in self._staged.items():
+            if (
+                staged_mode == mode
+                and options == [filter_key, transform_key]
+                and os.path.commonpath([staged_path, src_path]) == staged_path
+                and os.path.isdir(staged_path)
+                and not _failed(staged[1])
+            ):
+                return staged_path, staged
+        return src_path, None
+
+    def _plan_staging(
+        self,
+        src_path: str,
+        mode: str,
+        file_filter: staging.FileFilter,
+        transform: Optional[ImageTransform],
+    ) -> tuple[str, Optional[Callable[[], None]]]:
+        """Computes where a source will be staged.
+        Args:
+            src_path (str): The existing file or directory to stage.
+            mode (str): The staging mode to use.
+            file_filter (staging.FileFilter): Selects the files to stage.
+            transform (Optional[ImageTransform]): Resizes the staged images.
+        Returns:
+            tuple[str, Optional[Callable[[], None]]]: The path of the source inside
+                the container, and the work left to do to stage it, if any.
+        """
+        if mode == "mount":
+            return self._plan_mount(src_path), None
+        if mode == "cache":
+            return self._plan_cache(src_path, file_filter, transform)
+        if mode == "sync":
+            return self._plan_sync(src_path, file_filter)
+        if mode == "archive":
+            return self._plan_archive(src_path, file_filter, transform)
+        return self._plan_copy(src_path, file_filter, transform)
+
+    def _resolve_source(self, local_path: str, copy_depth: int) -> tuple[str, str]:
+        """Resolves the absolute local path and the source path to stage.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include.
+        Returns:
+            tuple[str, str]: The absolute local path and the effective source path.
         """
         abs_local_path = os.path.abspath(local_path)
 
@@ -238,69 +1101,563 @@ class DockerManager:
         src_path = abs_local_path
         for i in range(copy_depth):
             src_path = os.path.dirname(src_path)
+        return abs_local_path, src_path
 
-        # If path is already in the main output volume, just calculate container path
-        if src_path.startswith(self.output_base_path):
-            return os.path.join(
-                self.workspace_path,
-                os.path.relpath(abs_local_path, self.output_base_path),
-            )
+    @staticmethod
+    def _source_namespace(
+        src_path: str,
+        file_filter: Optional[staging.FileFilter] = None,
+        transform: Optional[ImageTransform] = None,
+    ) -> str:
+        """Returns a short identifier of a source, used to keep staged data apart.
+        Args:
+            src_path (str): The absolute source path.
+            file_filter (Optional[staging.FileFilter]): The filter applied to the
+                source, if any.
+            transform (Optional[ImageTransform]): The transform applied to the
+                source, if any.
+        Returns:
+            str: The first 12 hex digits of the SHA-1 of the path, filter and
+                transform.
+        """
+        identity = src_path
+        if file_filter is not None and file_filter.key():
+            identity += "\0" + file_filter.key()
+        if transform is not None:
+            identity += "\0" + transform.key()
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:12]
 
-        # Otherwise, copy to temp volume and return container path
-        base_name = os.path.basename(src_path)
-        dest_host_path = os.path.join(
-            self._internal_temp_data_host_path.name, base_name
+    def _to_workspace_path(self, host_path: str) -> str:
+        """Converts a host path inside output_base_path to its container path.
+        Args:
+            host_path (str): An absolute path inside output_base_path.
+        Returns:
+            str: The corresponding path inside the container.
+        """
+        return os.path.join(
+            self.workspace_path,
+            os.path.relpath(host_path, self.output_base_path),
         )
 
-        if os.path.isdir(src_path):
-            shutil.copytree(
+    def _to_host_path(self, container_path: str) -> Optional[str]:
+        """Converts a path as seen by commands to its host path.
+        Args:
+            container_path (str): A path inside the workspace, or relative to it.
+        Returns:
+            Optional[str]: The corresponding host path inside output_base_path, or
+                None if the path is outside the workspace.
+        """
+        path = os.path.normpath(os.path.join(self.workspace_path, container_path))
+        if os.path.commonpath([path, self.workspace_path]) != self.workspace_path:
+            return None
+        return os.path.join(
+            self.output_base_path, os.path.relpath(path, self.workspace_path)
+        )
+
+    def mount_path(self, local_path: str, copy_depth: int = 0) -> str:
+        """Exposes a local file or directory to the container without copying it.
+
+        The source is bind-mounted read-only under /ns_mounts. If the running
+        container does not have the mount yet, it is recreated with the extra volume,
+        which is refused while commands are running in it: declare the directory
+        with the mounts argument of the manager instead. In local mode the host
+        path is returned unchanged.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include in the mount.
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        return self.stage_path(local_path, copy_depth, "mount")
+
+    def _plan_mount(self, src_path: str) -> str:
+        """Bind-mounts a source, see mount_path()."""
+        if not self.use_docker:
+            return src_path
+
+        # Reuse an existing mount if it already covers the source
+        for mounted_path, container_path in self._mounts.items():
+            if os.path.commonpath([mounted_path, src_path]) == mounted_path:
+                return os.path.normpath(
+                    os.path.join(
+                        container_path, os.path.relpath(src_path, mounted_path)
+                    )
+                )
+
+        container_path = self._mount_container_path(src_path)
+        self._mounts[src_path] = container_path
+        logging.info(f"Mounting {src_path} read-only at {container_path}")
+        try:
+            self._restart_container()
+        except RuntimeError:
+            del self._mounts[src_path]
+            raise
+        return container_path
+
+    def _mount_container_path(self, src_path: str) -> str:
+        """Returns where a bind-mounted source appears in the container."""
+        return os.path.join(
+            self.mounts_container_path,  # type: ignore
+            self._source_namespace(src_path),
+            os.path.basename(src_path),
+        )
+
+    def _copy_source(
+        self,
+        src_path: str,
+        dest_host_path: str,
+        file_filter: Optional[staging.FileFilter] = None,
+        transform: Optional[ImageTransform] = None,
+    ) -> staging.StagingReport:
+        """Copies a file or directory, cloning files when possible.
+        Args:
+            src_path (str): The existing file or directory to copy.
+            dest_host_path (str): The destination path on the host.
+            file_filter (Optional[staging.FileFilter]): Selects the files of a
+                directory to copy.
+            transform (Optional[ImageTransform]): Resizes the images while they are
+                copied.
+        Returns:
+            staging.StagingReport: The strategy used for each file.
+        """
+        if transform is not None:
+            report = transform.apply(src_path, dest_host_path, file_filter)
+        elif os.path.isdir(src_path):
+            report = staging.copy_tree(
                 src_path,
                 dest_host_path,
-                dirs_exist_ok=True,
-                ignore=shutil.ignore_patterns("*.tmp"),
+                file_filter=file_filter,
+                allow_hardlink=self.allow_hardlinks,
+                workers=self.copy_workers,
             )
-        elif os.path.isfile(src_path):
-            os.makedirs(os.path.dirname(dest_host_path), exist_ok=True)
-            shutil.copy(src_path, dest_host_path)
         else:
-            # If path doesn't exist, return it as is, assuming it's not a path
-            return local_path
+            start_time = time.perf_counter()
+            os.makedirs(os.path.dirname(dest_host_path), exist_ok=True)
+            strategy = staging.copy_file(
+                src_path,
+                dest_host_path,
+                same_fs=staging.same_filesystem(
+                    src_path, os.path.dirname(dest_host_path)
+                ),
+                allow_hardlink=self.allow_hardlinks,
+            )
+            report = staging.StagingReport({os.path.basename(src_path): strategy})
+            report.num_bytes = os.path.getsize(dest_host_path)
+            report.elapsed = time.perf_counter() - start_time
 
-        relative_path_from_src = os.path.relpath(abs_local_path, start=src_path)
+        staging.log_report(src_path, report)
+        self.last_staging_report = report
+        return report
 
-        base_dest = os.path.join(
-            self.internal_temp_data_container_path, os.path.basename(src_path)
+    def copy_to_ns_temp_data(self, local_path: str, copy_depth: int = 0) -> str:
+        """Copies a local file or directory to the internal temporary data volume.
+
+        Each source is copied to its own directory, named after a hash of its path,
+        so inputs with the same name do not overwrite each other. When the source
+        and the volume share a filesystem, files are cloned (reflink, hard link if
+        allowed, copy_file_range) instead of copied byte by byte. The strategy used
+        for each file is kept in last_staging_report.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include in the copy.
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        return self.stage_path(local_path, copy_depth, "copy")
+
+    def _plan_copy(
+        self,
+        src_path: str,
+        file_filter: staging.FileFilter,
+        transform: Optional[ImageTransform],
+    ) -> tuple[str, Callable[[], None]]:
+        """Plans a copy to the temporary volume, see copy_to_ns_temp_data()."""
+        namespace = self._source_namespace(src_path, file_filter, transform)
+        base_name = os.path.basename(src_path)
+        dest_host_path = os.path.join(
+            self._internal_temp_data_host_path.name, namespace, base_name
+        )
+        container_path = os.path.join(
+            self.internal_temp_data_container_path, namespace, base_name
+        )
+        return container_path, lambda: self._copy_source(
+            src_path, dest_host_path, file_filter, transform
         )
 
-        final_path = os.path.join(base_dest, relative_path_from_src)
+    def copy_to_staging_cache(self, local_path: str, copy_depth: int = 0) -> str:
+        """Copies a local file or directory to the persistent staging cache.
 
-        return os.path.normpath(final_path)
+        The cache lives in output_base_path/.cache/staging and is keyed by a
+        fingerprint of the source (paths, sizes and modification times), so staging
+        an unchanged source again, even from another process, copies nothing. The
+        entries used by the manager are leased until cleanup(), so that no process
+        evicts them meanwhile. The returned path is a link to the entry.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include in the copy.
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        return self.stage_path(local_path, copy_depth, "cache")
+
+    def _plan_cache(
+        self,
+        src_path: str,
+        file_filter: staging.FileFilter,
+        transform: Optional[ImageTransform],
+    ) -> tuple[str, Callable[[], None]]:
+        """Plans a copy to the staging cache, see copy_to_staging_cache().
+
+        The cache entry depends on a fingerprint of the source, which takes a stat
+        of every file, so it is only computed by the background work. Commands see
+        the entry through a link in the temporary volume, whose path is known
+        right away. The link points to the whole entry, so the downscale pyramid
+        of a transform sits next to the staged directory as in the other modes.
+        """
+        base_name = os.path.basename(src_path)
+        namespace = self._source_namespace(src_path, file_filter, transform)
+        link_host_path = os.path.join(
+            self._internal_temp_data_host_path.name, "cache", namespace
+        )
+        container_path = os.path.join(
+            self.internal_temp_data_container_path, "cache", namespace, base_name
+        )
+
+        def populate(partial_path: str) -> int:
+            dest_host_path = os.path.join(partial_path, base_name)
+            self._copy_source(src_path, dest_host_path, file_filter, transform)
+            return staging.disk_usage(partial_path)
+
+        def stage():
+            key = staging.fingerprint(src_path, file_filter)
+            if transform is not None:
+                identity = f"{key}\0{transform.key()}"
+                key = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+            entry_path = self.staging_cache.get(key)
+            if entry_path is not None:
+                logging.info(f"Staging cache hit for {src_path} ({key[:12]})")
+            else:
+                entry_path = self.staging_cache.add(key, populate)
+
+            os.makedirs(os.path.dirname(link_host_path), exist_ok=True)
+            if os.path.lexists(link_host_path):
+                os.unlink(link_host_path)
+            # The target is the entry as seen by commands, inside the workspace
+            os.symlink(self._to_workspace_path(entry_path), link_host_path)
+
+        return container_path, stage
+
+    def sync_to_staging_dir(self, local_path: str, copy_depth: int = 0) -> str:
+        """Incrementally mirrors a local directory to a persistent staging directory.
+
+        Each source gets its own directory in output_base_path/.cache/sync, next to
+        a manifest of the staged files. Only files added or changed since the last
+        sync are copied, and files removed from the source are deleted. Single files
+        are copied as is.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include in the copy.
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        return self.stage_path(local_path, copy_depth, "sync")
+
+    def _plan_sync(
+        self, src_path: str, file_filter: staging.FileFilter
+    ) -> tuple[str, Callable[[], None]]:
+        """Plans an incremental sync, see sync_to_staging_dir()."""
+        base_name = os.path.basename(src_path)
+        sync_dir = os.path.join(
+            self.output_base_path,
+            ".cache",
+            "sync",
+            self._source_namespace(src_path, file_filter),
+        )
+        dest_host_path = os.path.join(sync_dir, base_name)
+
+        def sync():
+            os.makedirs(sync_dir, exist_ok=True)
+            with staging.file_lock(os.path.join(sync_dir, ".lock")):
+                if os.path.isdir(src_path):
+                    report = staging.sync_tree(
+                        src_path,
+                        dest_host_path,
+                        os.path.join(sync_dir, "manifest.json"),
+                        file_filter=file_filter,
+                        allow_hardlink=self.allow_hardlinks,
+                        checksum=self.sync_checksum,
+                        workers=self.copy_workers,
+                    )
+                    staging.log_report(src_path, report)
+                    self.last_staging_report = report
+                else:
+                    self._copy_source(src_path, dest_host_path)
+
+        return self._to_workspace_path(dest_host_path), sync
+
+    def copy_to_container(self, local_path: str, copy_depth: int = 0) -> str:
+        """Streams a local file or directory into the container as a tar archive.
+
+        Unlike the other staging modes, this does not need the Docker daemon to see
+        the host filesystem, so it works with remote daemons (DOCKER_HOST=tcp://...).
+        The data is extracted under /ns_archive_data in the container filesystem.
+        In local mode the data is copied to the temporary volume instead.
+        Args:
+            local_path (str): The path to the local file or directory.
+            copy_depth (int): The number of parent directories to include in the copy.
+        Returns:
+            str: The path of the file or directory inside the container.
+        """
+        return self.stage_path(local_path, copy_depth, "archive")
+
+    def _plan_archive(
+        self,
+        src_path: str,
+        file_filter: staging.FileFilter,
+        transform: Optional[ImageTransform],
+    ) -> tuple[str, Callable[[], None]]:
+        """Plans a tar stream into the container, see copy_to_container()."""
+        base_name = os.path.basename(src_path)
+        namespace = self._source_namespace(src_path, file_filter, transform)
+        container_dir = os.path.join(self.archive_container_path, namespace)
+
+        def put_archive():
+            staging.make_archive_directory(
+                self.container,
+                container_dir,
+                owner=f"{os.getuid()}" if hasattr(os, "getuid") else None,
+            )
+
+            sources = [(src_path, base_name, file_filter)]
+            if transform is not None:
+                # Transform on the host first, then stream the smaller result
+                transformed_path = os.path.join(
+                    self._internal_temp_data_host_path.name, namespace, base_name
+                )
+                self._copy_source(src_path, transformed_path, file_filter, transform)
+                sources = [(transformed_path, base_name, None)]
+                if os.path.isdir(src_path):
+                    sources += [
+                        (level_path, os.path.basename(level_path), None)
+                        for _, level_path in transform.pyramid_paths(transformed_path)
+                    ]
+
+            for source_path, arcname, source_filter in sources:
+                report = staging.put_archive(
+                    self.client.api,
+                    self.container.id,
+                    source_path,
+                    container_dir,
+                    arcname,
+                    file_filter=source_filter,
+                    compression=self.archive_compression,
+                )
+                staging.log_report(source_path, report)
+                self.last_staging_report = report
+
+        return os.path.join(container_dir, base_name), put_archive
+
+
+async def _read_fork_server_frames(
+    reader: asyncio.StreamReader, handle_chunk: Callable[[bytes], None]
+) -> int:
+    """Forwards the output frames of the fork server, then returns the exit code.
 
+    Raises:
+        ConnectionError: If the server closed the connection without an exit code.
+    """
+    try:
+        while True:
+            header = await reader.readexactly(fork_server.FRAME_HEADER.size)
+            frame_type, size = fork_server.FRAME_HEADER.unpack(header)
+            payload = await reader.readexactly(size)
+            if frame_type == b"X":
+                return int(payload)
+            handle_chunk(payload)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("The fork server closed the connection.") from None
+
+
+async def _stream_in_thread(
+    open_stream: Callable[[], Iterable[bytes]],
+) -> AsyncIterator[bytes]:
+    """Iterates a blocking stream from a dedicated thread.
+
+    Each stream gets its own thread rather than a slot of the default executor, so
+    that long-running streams do not starve other asyncio.to_thread() calls.
+    Args:
+        open_stream (Callable[[], Iterable[bytes]]): Opens the stream. Called from
+            the thread.
+    Yields:
+        bytes: The chunks of the stream.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            pass  # The event loop was closed before the stream ended
 
+    def pump():
+        try:
+            for chunk in open_stream():
+                put(chunk)
+            put(done)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=pump, name="nsdw-exec-stream", daemon=True).start()
+    while (item := await queue.get()) is not done:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def _done_future() -> Future:
+    """Returns a future that is already completed."""
+    future: Future = Future()
+    future.set_result(None)
+    return future
+
+
+def _run_now(work: Callable[[], None]) -> Future:
+    """Runs a function in the calling thread and wraps its outcome in a future."""
+    future: Future = Future()
+    _run_into(future, work)
+    return future
+
+
+def _run_into(future: Future, work: Callable[[], None]):
+    """Runs a function and sets its outcome on a future, unless it was cancelled."""
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        work()
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(None)
+
+
+def _failed(future: Future) -> bool:
+    """Checks whether a future completed with an exception."""
+    return future.done() and not future.cancelled() and future.exception() is not None
+
+
+# The default manager, used by commands that are not bound to another one
 _manager: Optional[DockerManager] = None
+# The arguments init() created the default manager with
+_manager_arguments: Optional[dict] = None
+_manager_lock = threading.Lock()
 
 
 def init(
     output_base_path: str = "./nerfstudio_output",
     image_name: Optional[str] = "jourdelune876/nerfstudio-full-dep:latest",
-):
+    staging_mode: str = "copy",
+    allow_hardlinks: bool = False,
+    staging_cache_size: Optional[int] = None,
+    sync_checksum: bool = False,
+    copy_workers: Optional[int] = None,
+    background_staging: bool = True,
+    archive_compression: Optional[str] = None,
+    gpus: Optional[Union[int, Sequence[Union[int, str]], str, GpuPool]] = None,
+    viewer_port: Optional[int] = 7007,
+    use_fork_server: bool = False,
+    output_tail_size: Optional[int] = None,
+    log_dir: Optional[str] = None,
+    collapse_progress: bool = True,
+    echo_interval: float = 0.1,
+    kill_timeout: float = DEFAULT_KILL_TIMEOUT,
+    mounts: Optional[Iterable[str]] = None,
+) -> DockerManager:
     """Initializes the Docker wrapper.
+
+    Creates the default manager, used by commands that are not given one. Calling
+    init() again with the same arguments (e.g. re-running a notebook cell) returns
+    the current default manager. With other arguments, the previous default
+    manager is cleaned up, stopping its container, and replaced. To drive several
+    containers at once, create DockerManager instances directly and pass them to
+    the command factories.
     Args:
         output_base_path (str): Local path where Nerfstudio will store its outputs
             (mounted to /workspace).
         image_name (Optional[str]): The name of the Docker image to use. If None, commands are run on the host.
+        staging_mode (str): How nsdw.path() inputs are exposed to Nerfstudio by default.
+            "copy" copies them to an internal temporary volume, "mount" bind-mounts
+            them read-only without copying and "cache" copies them to a persistent
+            cache under output_base_path that is reused across sessions. "sync"
+            incrementally mirrors them to a persistent directory, copying only
+            added or changed files. "archive" streams them into the container as a
+            tar archive, which also works with remote Docker daemons.
+        allow_hardlinks (bool): Whether copied inputs may be hard links to their source
+            when reflinks are not supported. Only enable this for read-only inputs.
+        staging_cache_size (Optional[int]): The size budget in bytes of the persistent
+            staging cache. Least recently used entries are evicted beyond it.
+        sync_checksum (bool): Whether the "sync" mode also compares content hashes.
+        copy_workers (Optional[int]): The number of threads used to copy directories.
+        background_staging (bool): Whether the inputs of a command are staged in the
+            background once it runs, instead of blocking until each copy is done.
+        archive_compression (Optional[str]): The compression used by the "archive"
+            mode: None, "gzip" or "zstd" (requires the zstandard package).
+        gpus (Optional[Union[int, Sequence[Union[int, str]], str, GpuPool]]): The GPUs
+            to schedule commands on: a number of GPUs, a list of device IDs, "auto",
+            or a GpuPool shared with other managers.
+            Each command is pinned to its own GPU through CUDA_VISIBLE_DEVICES and
+            waits for a free one, so concurrent jobs spread over the GPUs. None lets
+            every command see all GPUs.
+        viewer_port (Optional[int]): The host port the viewer is published on, or
+            None to not publish it.
+        use_fork_server (bool): Whether commands are forked from a resident process
+            that has already imported Nerfstudio, instead of starting a new Python
+            process for each command. Requires a local Docker daemon.
+        output_tail_size (Optional[int]): Keeps only the last output_tail_size
+            characters of each command's output in memory and streams the full output
+            to a log file. Commands then return a CommandLog handle instead of a
+            string. Useful for long trainings with verbose progress bars.
+        log_dir (Optional[str]): The directory of the log files, defaults to
+            output_base_path/logs.
+        collapse_progress (bool): Whether progress bar redraws ("\\r") are collapsed
+            to their latest state in the stored and echoed output.
+        echo_interval (float): The minimum time in seconds between two writes of
+            command output to stdout.
+        kill_timeout (float): The grace period in seconds between the SIGINT and
+            the SIGKILL sent to cancelled or timed out commands.
+        mounts (Optional[Iterable[str]]): Local directories bind-mounted read-only
+            when the container starts, so that "mount" inputs inside them never
+            require recreating the container.
+    Returns:
+        DockerManager: The default manager.
+    Raises:
+        RuntimeError: If the container cannot be started.
     """
-    global _manager
-    if _manager is None:
-        _manager = DockerManager(
-            output_base_path=output_base_path, image_name=image_name
-        )
+    global _manager, _manager_arguments
+    if mounts is not None:
+        mounts = tuple(mounts)
+    arguments = dict(locals())
+    with _manager_lock:
+        if _manager is not None and not _manager._closed:
+            if arguments == _manager_arguments:
+                logging.info("Reusing the default manager.")
+                return _manager
+            # Free its container, and the viewer port, before starting the new one
+            logging.info("Replacing the default manager.")
+            _manager.cleanup()
+        _manager = None
+        _manager_arguments = None
+        manager = DockerManager(**arguments)
+        _manager = manager
+        _manager_arguments = arguments
+    return manager
 
 
 def _get_manager() -> DockerManager:
-    """Returns the DockerManager instance.
+    """Returns the default DockerManager instance, created by init().
     Returns:
-        DockerManager: The DockerManager instance.
+        DockerManager: The default DockerManager instance.
     Raises:
         RuntimeError: If the DockerManager has not been initialized.
     """
@@ -0,0 +1,427 @@
+import codecs
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Iterable, Iterator, Optional, TextIO, Union
+
+
+def log_file_path(log_dir: str, command: list[str]) -> str:
+    """Returns a new, unique path for the log of a command.
+
+    Args:
+        log_dir (str): The directory of the logs.
+        command (list[str]): The command, whose program names the log.
+
+    Returns:
+        str: <log_dir>/<date>-<time>-<program>-<id>.log
+    """
+    program = os.path.basename(command[0].split()[0]) if command else "command"
+    program = re.sub(r"[^\w.-]", "_", program)
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(log_dir, f"{timestamp}-{program}-{uuid.uuid4().hex[:8]}.log")
+
+
+class CommandLog:
+    """A lazy handle to the full output of a command, stored in a log file.
+
+    Only the tail of the output is kept in memory; the rest is read from the file
+    on demand.
+
+    Args:
+        path (str): The log file.
+        tail (str): The last characters of the output.
+    """
+
+    def __init__(self, path: str, tail: str):
+        self.path = path
+        self.tail = tail
+
+    def __repr__(self) -> str:
+        return f"CommandLog({self.path!r})"
+
+    def __str__(self) -> str:
+        return self.read()
+
+    @property
+    def size(self) -> int:
+        """The size of the log file in bytes."""
+        return os.path.getsize(self.path)
+
+    def read(self) -> str:
+        """Reads the whole log in memory."""
+        with open(self.path, encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def lines(self) -> Iterator[str]:
+        """Iterates over the lines of the log without loading it in memory.
+
+        Yields:
+            str: The lines of the log, without their line ending.
+        """
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def splitlines(self) -> list[str]:
+        """Returns the lines of the log, like str.splitlines()."""
+        return list(self.lines())
+
+
+class OutputBuffer:
+    """Collects the output of a command.
+
+    By default the whole output is kept in memory. With a tail size, only the last
+    tail_size characters are kept in a ring buffer and the full output is streamed
+    to a log file instead.
+
+    Args:
+        tail_size (Optional[int]): The number of characters kept in memory, or None
+            to keep everything.
+        log_path (Optional[str]): The file the full output is written to.
+    """
+
+    def __init__(self, tail_size: Optional[int] = None, log_path: Optional[str] = None):
+        self.tail_size = tail_size
+        self.log_path = log_path
+        self._chunks: deque[str] = deque()
+        self._size = 0  # Characters currently in _chunks
+        self._dropped = 0  # Characters dropped from the front of _chunks
+        self._lock = threading.Lock()
+        self._log_file = None
+        if log_path is not None:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            self._log_file = open(log_path, "w", encoding="utf-8", newline="")
+
+    @property
+    def position(self) -> int:
+        """The total number of characters appended so far."""
+        return self._dropped + self._size
+
+    def append(self, text: str):
+        """Adds a chunk of output."""
+        if not text:
+            return
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.write(text)
+            self._chunks.append(text)
+            self._size += len(text)
+            if self.tail_size is not None:
+                self._trim()
+
+    def _trim(self):
+        """Drops the oldest characters beyond tail_size."""
+        while (
+            len(self._chunks) > 1
+            and self._size - len(self._chunks[0]) >= self.tail_size  # type: ignore
+        ):
+            self._size -= len(self._chunks[0])
+            self._dropped += len(self._chunks.popleft())
+        excess = self._size - self.tail_size  # type: ignore
+        if excess > 0:
+            self._chunks[0] = self._chunks[0][excess:]
+            self._size -= excess
+            self._dropped += excess
+
+    def getvalue(self) -> str:
+        """Returns the output kept in memory: all of it, or its tail."""
+        with self._lock:
+            if len(self._chunks) > 1:
+                self._chunks = deque(["".join(self._chunks)])
+            return self._chunks[0] if self._chunks else ""
+
+    def read_from(self, position: int) -> tuple[str, int]:
+        """Returns the output appended since a position.
+
+        Args:
+            position (int): A position previously returned by this method, or 0.
+
+        Returns:
+            tuple[str, int]: The new output, and the position to read from next.
+                Output that has already left the tail is skipped.
+        """
+        with self._lock:
+            remaining = self.position - max(position, self._dropped)
+            parts = []
+            for chunk in reversed(self._chunks):
+                if remaining <= 0:
+                    break
+                parts.append(chunk[-remaining:])
+                remaining -= len(chunk)
+            return "".join(reversed(parts)), self.position
+
+    def close(self):
+        """Flushes and closes the log file."""
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
+    def result(self):
+        """Returns the output to hand back to the caller.
+
+        Returns:
+            Union[str, CommandLog]: The whole output, or a handle to the log file
+                when only the tail is kept in memory.
+        """
+        if self.log_path is None:
+            return self.getvalue()
+        self.close()
+        return CommandLog(self.log_path, self.getvalue())
+
+
+class LineAssembler:
+    """Splits a stream of text chunks into complete lines.
+
+    Chunks are only scanned once: the incomplete end of a chunk is kept until the
+    newline that completes it arrives.
+    """
+
+    def __init__(self):
+        self._partial: list[str] = []
+
+    def feed(self, text: str) -> list[str]:
+        """Processes a chunk of text.
+
+        Args:
+            text (str): The chunk.
+
+        Returns:
+            list[str]: The lines completed by the chunk, without their line ending.
+        """
+        if "\n" not in text:
+            if text:
+                self._partial.append(text)
+            return []
+        lines = text.split("\n")
+        if self._partial:
+            lines[0] = "".join(self._partial) + lines[0]
+            self._partial = []
+        if lines[-1]:
+            self._partial.append(lines[-1])
+        return [line.rstrip("\r") for line in lines[:-1]]
+
+    def flush(self) -> list[str]:
+        """Returns the incomplete last line, if any, at the end of the stream."""
+        line = "".join(self._partial).rstrip("\r")
+        self._partial = []
+        return [line] if line else []
+
+
+class ProgressCollapser:
+    """Collapses the carriage-return redraws of progress bars.
+
+    Progress bars (tqdm, rich...) redraw their line many times a second by writing
+    "\\r" followed by the new state. Only the last state of each line is kept.
+    "\\r\\n" line endings, written by terminals, are treated as plain newlines.
+    """
+
+    def __init__(self):
+        self.line = ""  # Latest state of the line being written
+        self._pending_cr = False  # A chunk ended with "\r", maybe half of "\r\n"
+
+    def feed(self, text: str) -> str:
+        """Processes a chunk of output.
+
+        Args:
+            text (str): The chunk.
+
+        Returns:
+            str: The lines completed by the chunk, with their redraws collapsed. The
+                incomplete last line is kept in the line attribute.
+        """
+        if self._pending_cr:
+            text = "\r" + text
+        self._pending_cr = text.endswith("\r")
+        if self._pending_cr:
+            text = text[:-1]
+
+        segments = text.replace("\r\n", "\n").split("\n")
+        completed = []
+        for segment in segments[:-1]:
+            completed.append(self._update(segment) + "\n")
+            self.line = ""
+        self.line = self._update(segments[-1])
+        return "".join(completed)
+
+    def _update(self, segment: str) -> str:
+        """Returns the state of the current line after a segment without newline."""
+        if "\r" in segment:
+            return segment.rsplit("\r", 1)[1]
+        return self.line + segment
+
+    def flush(self) -> str:
+        """Returns the incomplete last line, at the end of the output."""
+        line, self.line = self.line, ""
+        self._pending_cr = False
+        return line
+
+
+def _is_terminal(stream: TextIO) -> bool:
+    """Checks whether a stream is an interactive terminal."""
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+class TerminalEcho:
+    """Echoes command output to a terminal at a bounded rate.
+
+    Completed lines are written in batches, at most once per min_interval seconds,
+    and the progress line being redrawn is only shown in its latest state. When the
+    stream is not a terminal (e.g. redirected to a file), the progress line is not
+    redrawn in place: only completed lines are written.
+
+    Args:
+        stream (Optional[TextIO]): The stream to write to, defaults to sys.stdout.
+        min_interval (float): The minimum time between two writes, in seconds.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, min_interval: float = 0.1):
+        self.stream = stream
+        self.min_interval = min_interval
+        self._pending = ""  # Completed lines not written yet
+        self._line = ""  # Latest state of the progress line
+        self._shown_width = 0  # Width of the progress line shown on the terminal
+        self._last_write = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def write(self, text: str, line: str = ""):
+        """Queues output for the terminal.
+
+        Args:
+            text (str): Completed lines.
+            line (str): The latest state of the incomplete last line.
+        """
+        with self._lock:
+            self._pending += text
+            self._line = line
+            delay = self._last_write + self.min_interval - time.monotonic()
+            if delay <= 0:
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(delay, self._write_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _write_later(self):
+        with self._lock:
+            self._timer = None
+            self._write()
+
+    def _write(self, final: bool = False):
+        """Writes the queued output. Must be called with the lock held.
+
+        Args:
+            final (bool): Whether the output is over, so that an incomplete last
+                line is written even when the stream is not a terminal.
+        """
+        stream = self.stream or sys.stdout
+        if not _is_terminal(stream):
+            text = self._pending + (self._line if final else "")
+            if text:
+                stream.write(text)
+                stream.flush()
+            self._pending = ""
+            self._last_write = time.monotonic()
+            return
+
+        if not self._pending and len(self._line) == self._shown_width:
+            return
+        text = self._pending + self._line
+        if self._shown_width:
+            # Clear the progress line currently shown before writing over it
+            text = "\r" + " " * self._shown_width + "\r" + text
+        stream.write(text)
+        stream.flush()
+        self._pending = ""
+        self._shown_width = len(self._line)
+        self._last_write = time.monotonic()
+
+    def close(self):
+        """Writes everything still queued."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._write(final=True)
+
+
+class OutputPipeline:
+    """Routes the output of a command to its buffer, the terminal and line callbacks.
+
+    Raw bytes are decoded incrementally as UTF-8, so multi-byte characters split
+    across chunks are decoded correctly.
+
+    Args:
+        buffer (OutputBuffer): Stores the output.
+        echo (Optional[Union[TerminalEcho, Callable[[str], None]]]): Where the output
+            is echoed, if anywhere. Callables receive the completed lines.
+        collapse_progress (bool): Whether progress bar redraws are collapsed, see
+            ProgressCollapser.
+        line_callbacks (Iterable[Callable[[str], None]]): Called with each complete
+            line of output, without its line ending.
+    """
+
+    def __init__(
+        self,
+        buffer: OutputBuffer,
+        echo: Optional[Union[TerminalEcho, Callable[[str], None]]] = None,
+        collapse_progress: bool = True,
+        line_callbacks: Iterable[Callable[[str], None]] = (),
+    ):
+        self.buffer = buffer
+        self.echo = echo
+        self.line_callbacks = list(line_callbacks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._collapser = ProgressCollapser() if collapse_progress else None
+        self._lines = LineAssembler()
+
+    def feed_bytes(self, data: bytes):
+        """Processes a chunk of raw output."""
+        self.feed(self._decoder.decode(data))
+
+    def feed(self, text: str):
+        """Processes a chunk of decoded output."""
+        if not text:
+            return
+        line = ""
+        if self._collapser is not None:
+            text = self._collapser.feed(text)
+            line = self._collapser.line
+        self.buffer.append(text)
+        self._echo(text, line)
+        if self.line_callbacks:
+            self._call_line_callbacks(self._lines.feed(text))
+
+    def _call_line_callbacks(self, lines: list[str]):
+        for line in lines:
+            for callback in self.line_callbacks:
+                callback(line)
+
+    def _echo(self, text: str, line: str):
+        if isinstance(self.echo, TerminalEcho):
+            self.echo.write(text, line)
+        elif self.echo is not None and text:
+            self.echo(text)
+
+    def close(self):
+        """Flushes the last incomplete line and closes the buffer."""
+        self.feed(self._decoder.decode(b"", final=True))
+        if self._collapser is not None:
+            text = self._collapser.flush()
+            self.buffer.append(text)
+            self._echo(text, "")
+            if self.line_callbacks:
+                self._lines.feed(text)
+        if self.line_callbacks:
+            self._call_line_callbacks(self._lines.flush())
+        if isinstance(self.echo, TerminalEcho):
+            self.echo.close()
+        self.buffer.close()
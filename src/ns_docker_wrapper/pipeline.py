@@ -0,0 +1,273 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Sequence, Union
+
+from .commands import Command
+from .manager import DockerManager, _get_manager
+from .progress import ProgressEvent
+from .results import RunResult
+
+# Programs that mostly use the GPU; the other commands are scheduled as CPU stages
+GPU_PROGRAMS = ("ns-train", "ns-export", "ns-render", "ns-eval", "ns-viewer")
+
+
+class Stage:
+    """A step of a pipeline, built from the results of the stages it depends on.
+
+    Args:
+        name (str): The unique name of the stage.
+        build (Callable[..., Command]): Builds the command of the stage. It is
+            called once the stages in after have succeeded, with their results as
+            positional arguments, in order.
+        after (Sequence[Stage]): The stages whose outputs the stage consumes.
+        resource (Optional[str]): "gpu" or "cpu", the kind of slot the stage runs
+            in. None infers it from the program of the command.
+        num_gpus (Optional[int]): The number of GPUs of the command, see
+            Command.run(). None takes one GPU for GPU stages, and none for CPU
+            stages so that they never wait for the GPU pool.
+        memoize (bool): Whether the stage is skipped when it is up to date, see
+            Command.run().
+        on_progress (Optional[Callable[[ProgressEvent], None]]): Called with the
+            training progress of the command, see Command.run().
+    """
+
+    def __init__(
+        self,
+        name: str,
+        build: Callable[..., Command],
+        after: Sequence["Stage"] = (),
+        resource: Optional[str] = None,
+        num_gpus: Optional[int] = None,
+        memoize: bool = False,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    ):
+        if resource not in (None, "gpu", "cpu"):
+            raise ValueError(f"Unknown resource '{resource}'. Expected 'gpu' or 'cpu'.")
+        self.name = name
+        self.build = build
+        self.after = list(after)
+        self.resource = resource
+        self.num_gpus = num_gpus
+        self.memoize = memoize
+        self.on_progress = on_progress
+        self.command: Optional[Command] = None
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r})"
+
+    def _resource(self) -> str:
+        """Returns the kind of slot the built command runs in."""
+        if self.resource is not None:
+            return self.resource
+        program = self.command._command_args[0].split()[0]  # type: ignore
+        return "gpu" if program in GPU_PROGRAMS else "cpu"
+
+    def _num_gpus(self) -> Optional[int]:
+        """Returns the number of GPUs the built command takes from the pool."""
+        if self.num_gpus is None and self._resource() == "cpu":
+            return 0
+        return self.num_gpus
+
+
+class Pipeline:
+    """Runs stages of commands as soon as their inputs are ready.
+
+    Stages declare the stages they depend on, and are started as soon as those
+    have succeeded and a slot of their kind is free. GPU and CPU stages have
+    separate slots, so with several scenes the preprocessing (COLMAP) of one
+    scene overlaps the training of another. Among the ready stages, the ones
+    added first start first, so scenes are finished in order.
+
+    Args:
+        gpu_slots (Optional[int]): The number of GPU stages running at once. None
+            uses the number of GPUs of the manager's GPU pool, or 1.
+        cpu_slots (int): The number of CPU stages running at once.
+        echo (bool): Whether the output of the commands is written to stdout. It
+            is interleaved when several stages run at once.
+        manager (Optional[DockerManager]): The manager whose GPU pool sizes the GPU
+            slots. Defaults to the one created by nsdw.init().
+
+    Raises:
+        ValueError: If a number of slots is lower than 1.
+    """
+
+    def __init__(
+        self,
+        gpu_slots: Optional[int] = None,
+        cpu_slots: int = 1,
+        echo: bool = False,
+        manager: Optional[DockerManager] = None,
+    ):
+        if cpu_slots < 1 or (gpu_slots is not None and gpu_slots < 1):
+            raise ValueError("A pipeline needs at least one slot of each kind.")
+        self.gpu_slots = gpu_slots
+        self.cpu_slots = cpu_slots
+        self.echo = echo
+        self._manager = manager
+        self.stages: dict[str, Stage] = {}
+        # Results of the stages that ran, and errors of those that could not run
+        self.results: dict[str, RunResult] = {}
+        self.errors: dict[str, BaseException] = {}
+
+    def add(
+        self,
+        name: str,
+        build: Callable[..., Command],
+        after: Sequence[Union[Stage, str]] = (),
+        resource: Optional[str] = None,
+        num_gpus: Optional[int] = None,
+        memoize: bool = False,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+    ) -> Stage:
+        """Adds a stage to the pipeline.
+
+        Args:
+            name (str): The unique name of the stage.
+            build (Callable[..., Command]): Builds the command from the results of
+                the stages in after, e.g. ``lambda processed:
+                nsdw.train("nerfacto").data(processed.container_output_dir)``.
+            after (Sequence[Union[Stage, str]]): The stages the stage depends on, or
+                their names. They must have been added before.
+            resource (Optional[str]): "gpu" or "cpu". None picks "gpu" for
+                ns-train, ns-export, ns-render, ns-eval and ns-viewer.
+            num_gpus (Optional[int]): The number of GPUs of the command. None takes
+                one GPU for GPU stages and none for CPU stages.
+            memoize (bool): Whether the stage is skipped when it is up to date.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Called from the
+                event loop with the training progress of the command.
+
+        Returns:
+            Stage: The new stage, to pass to the after argument of later stages.
+
+        Raises:
+            ValueError: If the name is already used or a dependency is unknown.
+        """
+        if name in self.stages:
+            raise ValueError(f"A stage named '{name}' already exists.")
+        dependencies = []
+        for dependency in after:
+            dependency_name = (
+                dependency if isinstance(dependency, str) else dependency.name
+            )
+            if dependency_name not in self.stages:
+                raise ValueError(f"Unknown stage '{dependency_name}'.")
+            dependencies.append(self.stages[dependency_name])
+        stage = Stage(
+            name, build, dependencies, resource, num_gpus, memoize, on_progress
+        )
+        self.stages[name] = stage
+        return stage
+
+    def _slots(self) -> dict[str, int]:
+        """Returns the number of stages of each kind that may run at once."""
+        gpu_slots = self.gpu_slots
+        if gpu_slots is None:
+            manager = self._manager if self._manager is not None else _get_manager()
+            gpu_slots = len(manager.gpu_pool) if manager.gpu_pool is not None else 1
+        return {"gpu": gpu_slots, "cpu": self.cpu_slots}
+
+    def _failed(self, stage: Stage) -> bool:
+        return stage.name in self.errors or (
+            stage.name in self.results and self.results[stage.name].exit_code != 0
+        )
+
+    def run(self) -> dict[str, RunResult]:
+        """Runs the pipeline until every stage has finished or cannot run.
+
+        Returns:
+            dict[str, RunResult]: The result of each stage, by name.
+
+        Raises:
+            RuntimeError: If some stages failed, or were skipped because a stage
+                they depend on failed. The results of the other stages are still
+                available in the results attribute.
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> dict[str, RunResult]:
+        """Runs the pipeline from an event loop, see run().
+
+        Cancelling the task terminates the running commands.
+        """
+        self.results.clear()
+        self.errors.clear()
+        free_slots = self._slots()
+        pending = list(self.stages.values())
+        running: dict[asyncio.Task, Stage] = {}
+
+        try:
+            while pending or running:
+                for stage in list(pending):
+                    if any(self._failed(dependency) for dependency in stage.after):
+                        logging.warning(
+                            f"Skipping stage {stage.name}: a dependency failed."
+                        )
+                        self.errors[stage.name] = RuntimeError("A dependency failed.")
+                        pending.remove(stage)
+                        continue
+                    if not all(
+                        dependency.name in self.results for dependency in stage.after
+                    ):
+                        continue
+                    if stage.command is None:
+                        try:
+                            stage.command = stage.build(
+                                *(
+                                    self.results[dependency.name]
+                                    for dependency in stage.after
+                                )
+                            )
+                        except Exception as e:
+                            logging.error(f"Could not build stage {stage.name}: {e}")
+                            self.errors[stage.name] = e
+                            pending.remove(stage)
+                            continue
+                    resource = stage._resource()
+                    if free_slots[resource] <= 0:
+                        continue
+                    free_slots[resource] -= 1
+                    pending.remove(stage)
+                    logging.info(f"Starting stage {stage.name} ({resource}).")
+                    running[asyncio.ensure_future(self._run_stage(stage))] = stage
+
+                if not running:
+                    break
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    stage = running.pop(task)
+                    free_slots[stage._resource()] += 1
+                    try:
+                        self.results[stage.name] = task.result()
+                    except Exception as e:
+                        logging.error(f"Stage {stage.name} failed: {e}")
+                        self.errors[stage.name] = e
+        except BaseException:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+        finally:
+            for stage in self.stages.values():
+                stage.command = None
+
+        failed = [name for name, stage in self.stages.items() if self._failed(stage)]
+        if failed:
+            raise RuntimeError(f"Pipeline stages failed: {', '.join(failed)}")
+        return self.results
+
+    async def _run_stage(self, stage: Stage) -> RunResult:
+        result = await stage.command.run_async(  # type: ignore
+            echo=self.echo,
+            num_gpus=stage._num_gpus(),
+            on_progress=stage.on_progress,
+            memoize=stage.memoize,
+        )
+        if result.exit_code != 0:
+            logging.error(
+                f"Stage {stage.name} failed with exit code {result.exit_code}."
+            )
+        else:
+            logging.info(f"Stage {stage.name} finished.")
+        return result
@@ -0,0 +1,182 @@
+import re
+from typing import Callable, Optional
+
+# Colors and cursor movements used by ns-train to redraw its statistics table
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+_STEP_HEADER = "Step (% Done)"
+_STEP_VALUE = re.compile(r"^(\d+)\s*\(\s*(\d+(?:\.\d+)?)\s*%\)")
+_MAX_ITERATIONS = re.compile(r"max[_-]num[_-]iterations\s*[=:]\s*(\d+)")
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)\s*(ms|d|h|m|s)\b")
+_NUMBER = re.compile(r"^(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\s*([KMBT]?)")
+_MAGNITUDES = {"": 1, "K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(text: str) -> Optional[float]:
+    """Parses a duration printed by ns-train, e.g. "38.219 ms" or "1 h, 2 m, 3 s".
+
+    Args:
+        text (str): The duration.
+
+    Returns:
+        Optional[float]: The duration in seconds, or None if it cannot be parsed.
+    """
+    parts = _DURATION_PART.findall(text)
+    if not parts:
+        return None
+    return sum(float(value) * _SECONDS[unit] for value, unit in parts)
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Parses a number printed by ns-train, e.g. "21.52" or "109.44 K".
+
+    Args:
+        text (str): The number, optionally followed by a magnitude suffix.
+
+    Returns:
+        Optional[float]: The number, or None if it cannot be parsed.
+    """
+    match = _NUMBER.match(text)
+    if match is None:
+        return None
+    return float(match.group(1)) * _MAGNITUDES[match.group(2)]
+
+
+class ProgressEvent:
+    """The state of a training, as last printed by ns-train.
+
+    Values that ns-train does not print are None.
+
+    Args:
+        step (int): The current step.
+        total_steps (Optional[int]): The number of steps of the training.
+        iterations_per_second (Optional[float]): The training throughput.
+        eta (Optional[float]): The estimated remaining time, in seconds.
+        loss (Optional[float]): The training loss.
+        psnr (Optional[float]): The latest test PSNR.
+        rays_per_second (Optional[float]): The number of training rays per second.
+        values (Optional[dict[str, str]]): Every column of the row, as printed.
+    """
+
+    def __init__(
+        self,
+        step: int,
+        total_steps: Optional[int] = None,
+        iterations_per_second: Optional[float] = None,
+        eta: Optional[float] = None,
+        loss: Optional[float] = None,
+        psnr: Optional[float] = None,
+        rays_per_second: Optional[float] = None,
+        values: Optional[dict[str, str]] = None,
+    ):
+        self.step = step
+        self.total_steps = total_steps
+        self.iterations_per_second = iterations_per_second
+        self.eta = eta
+        self.loss = loss
+        self.psnr = psnr
+        self.rays_per_second = rays_per_second
+        self.values = values or {}
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """The fraction of the training done, between 0 and 1."""
+        if not self.total_steps:
+            return None
+        return min(self.step / self.total_steps, 1.0)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={value!r}"
+            for name, value in (
+                ("step", self.step),
+                ("total_steps", self.total_steps),
+                ("iterations_per_second", self.iterations_per_second),
+                ("eta", self.eta),
+                ("loss", self.loss),
+                ("psnr", self.psnr),
+            )
+            if value is not None
+        )
+        return f"ProgressEvent({fields})"
+
+
+class TrainProgressParser:
+    """Turns the statistics table printed by ns-train into progress events.
+
+    ns-train prints a header once, e.g. "Step (% Done)  Train Iter (time)  ETA
+    (time) ...", then redraws the rows below it with ANSI cursor movements. Lines
+    are parsed one at a time as they arrive, so events are emitted while the
+    training runs. Rows that are redrawn without a new step are ignored. Lines of
+    other commands never match the header and are skipped cheaply.
+
+    Args:
+        callback (Callable[[ProgressEvent], None]): Called with each new event.
+    """
+
+    def __init__(self, callback: Callable[[ProgressEvent], None]):
+        self.callback = callback
+        self.total_steps: Optional[int] = None
+        self._columns: Optional[list[tuple[str, int]]] = None  # (name, start)
+        self._offset = 0  # Position of the table in the lines
+        self._last_step = -1
+
+    def feed_line(self, line: str):
+        """Processes a line of output, without its line ending."""
+        if "\x1b" in line:
+            line = _ANSI_ESCAPE.sub("", line)
+        if _STEP_HEADER in line:
+            self._read_header(line)
+        elif self._columns is not None:
+            self._read_row(line)
+        elif self.total_steps is None and "num" in line and "iterations" in line:
+            # The configuration printed at startup contains the number of steps
+            match = _MAX_ITERATIONS.search(line)
+            if match is not None:
+                self.total_steps = int(match.group(1))
+
+    def _read_header(self, line: str):
+        """Records the name and position of the columns of the table."""
+        self._offset = line.index(_STEP_HEADER)
+        self._columns = [
+            (match.group(0), match.start())
+            for match in re.finditer(r"\S+(?: \S+)*", line[self._offset :])
+        ]
+
+    def _read_row(self, line: str):
+        """Emits an event for a row of the table showing a new step."""
+        line = line[self._offset :]
+        match = _STEP_VALUE.match(line)
+        if match is None:
+            return
+        step = int(match.group(1))
+        if step <= self._last_step:
+            return
+        self._last_step = step
+
+        columns = self._columns  # type: ignore
+        values = {}
+        for i, (name, start) in enumerate(columns):
+            end = columns[i + 1][1] if i + 1 < len(columns) else None
+            values[name] = line[start:end].strip()
+
+        total_steps = self.total_steps
+        percent = float(match.group(2))
+        if total_steps is None and percent > 0:
+            total_steps = round(step * 100 / percent)
+
+        event = ProgressEvent(step, total_steps, values=values)
+        for name, value in values.items():
+            if name.startswith("Train Iter") and "(time)" in name:
+                seconds = parse_duration(value)
+                if seconds:
+                    event.iterations_per_second = 1 / seconds
+            elif name.startswith("ETA"):
+                event.eta = parse_duration(value)
+            elif "Loss" in name:
+                event.loss = parse_number(value)
+            elif "PSNR" in name and event.psnr is None:
+                event.psnr = parse_number(value)
+            elif name.startswith("Train Rays"):
+                event.rays_per_second = parse_number(value)
+        self.callback(event)
@@ -0,0 +1,362 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import zipfile
+from typing import Iterable, Optional, Union
+
+from .output import CommandLog
+from .staging import file_lock
+
+CONFIG_FILE_NAME = "config.yml"
+CHECKPOINT_DIR_NAME = "nerfstudio_models"
+_CHECKPOINT_STEP = re.compile(r"^step-(\d+)\.ckpt$")
+
+
+def scan_outputs(directories: Iterable[str], since: float) -> list[str]:
+    """Lists the files written in some directories since a point in time.
+
+    Args:
+        directories (Iterable[str]): The directories to scan, recursively. Missing
+            directories are skipped, and files are accepted as well.
+        since (float): A timestamp, as returned by time.time().
+
+    Returns:
+        list[str]: The files modified at or after since, sorted.
+    """
+    files = set()
+    for directory in directories:
+        if os.path.isfile(directory):
+            candidates: Iterable[str] = [directory]
+        else:
+            candidates = (
+                os.path.join(root, name)
+                for root, _, names in os.walk(directory)
+                for name in names
+            )
+        for path in candidates:
+            try:
+                if os.path.getmtime(path) >= since:
+                    files.add(os.path.abspath(path))
+            except OSError:
+                continue  # Removed while scanning
+    return sorted(files)
+
+
+def is_complete_checkpoint(path: str) -> bool:
+    """Checks that a checkpoint was entirely written.
+
+    torch.save() writes a zip archive whose directory comes last, so a checkpoint
+    cut short by a crash or a reboot cannot be opened as an archive.
+
+    Args:
+        path (str): The path to the checkpoint.
+
+    Returns:
+        bool: Whether the checkpoint is a complete archive.
+    """
+    try:
+        size = os.path.getsize(path)
+        with zipfile.ZipFile(path) as archive:
+            entries = archive.infolist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+    return bool(entries) and all(
+        entry.header_offset + entry.compress_size <= size for entry in entries
+    )
+
+
+def latest_checkpoint(experiment_dir: str) -> Optional[tuple[str, int]]:
+    """Finds the latest complete checkpoint saved by the runs of an experiment.
+
+    Args:
+        experiment_dir (str): The directory holding the timestamped runs of the
+            experiment, i.e. output_dir/experiment_name/method_name.
+
+    Returns:
+        Optional[tuple[str, int]]: The path of the checkpoint with the highest step
+            and its step, or None if there is none. Truncated checkpoints are
+            skipped.
+    """
+    checkpoints = []
+    pattern = os.path.join(
+        glob.escape(experiment_dir), "*", CHECKPOINT_DIR_NAME, "step-*.ckpt"
+    )
+    for path in glob.glob(pattern):
+        match = _CHECKPOINT_STEP.match(os.path.basename(path))
+        if match is None:
+            continue
+        try:
+            checkpoints.append((int(match.group(1)), os.path.getmtime(path), path))
+        except OSError:
+            continue  # Removed while scanning
+
+    for step, _, path in sorted(checkpoints, reverse=True):
+        if is_complete_checkpoint(path):
+            return path, step
+        logging.warning(f"Skipping truncated checkpoint {path}.")
+    return None
+
+
+class RunResult(tuple):
+    """The result of a command: its exit code, output, and the files it wrote.
+
+    It unpacks like the (exit_code, output) tuple run() used to return. The files
+    are found by scanning the output directories of the command once it exits, so
+    the training config, checkpoints and exports can be passed to the next command
+    without parsing the output.
+
+    Args:
+        exit_code (int): The exit code of the command.
+        output (Union[str, CommandLog]): The output of the command.
+        files (list[str]): The host paths of the files the command wrote.
+        timings (dict[str, float]): Durations in seconds: "staging" to stage the
+            inputs, "execution" to run the command, and "total".
+        host_base_path (str): The host directory mounted as the workspace.
+        container_base_path (str): The workspace directory inside the container.
+        output_dirs (Optional[list[str]]): The host paths of the output
+            directories of the command, which were scanned for its files.
+        cached (bool): Whether the command was skipped and this result comes from
+            a previous run, see RunIndex.
+    """
+
+    def __new__(
+        cls,
+        exit_code: int,
+        output: Union[str, CommandLog],
+        files: Optional[list[str]] = None,
+        timings: Optional[dict[str, float]] = None,
+        host_base_path: str = "",
+        container_base_path: str = "",
+        output_dirs: Optional[list[str]] = None,
+        cached: bool = False,
+    ):
+        return super().__new__(cls, (exit_code, output))
+
+    def __init__(
+        self,
+        exit_code: int,
+        output: Union[str, CommandLog],
+        files: Optional[list[str]] = None,
+        timings: Optional[dict[str, float]] = None,
+        host_base_path: str = "",
+        container_base_path: str = "",
+        output_dirs: Optional[list[str]] = None,
+        cached: bool = False,
+    ):
+        self.exit_code = exit_code
+        self.output = output
+        self.files = files or []
+        self.timings = timings or {}
+        self.host_base_path = host_base_path
+        self.container_base_path = container_base_path
+        self.output_dirs = output_dirs or []
+        self.cached = cached
+
+    def __getnewargs__(self):
+        return (self.exit_code, self.output)
+
+    def __repr__(self) -> str:
+        return (
+            f"RunResult(exit_code={self.exit_code}, config_path={self.config_path!r}, "
+            f"exports={self.exports!r})"
+        )
+
+    def container_path(self, host_path: Optional[str]) -> Optional[str]:
+        """Converts a host path written by the command to its container path.
+
+        Args:
+            host_path (Optional[str]): A path inside the output base path.
+
+        Returns:
+            Optional[str]: The path inside the container, None if host_path is None.
+        """
+        if host_path is None or not self.container_base_path:
+            return host_path
+        return os.path.join(
+            self.container_base_path, os.path.relpath(host_path, self.host_base_path)
+        )
+
+    @property
+    def output_dir(self) -> Optional[str]:
+        """The host path of the (first) output directory of the command, if any."""
+        return self.output_dirs[0] if self.output_dirs else None
+
+    @property
+    def container_output_dir(self) -> Optional[str]:
+        """The output directory of the command, as seen from the container.
+
+        E.g. the directory processed by ns-process-data, to pass to ns-train.
+        """
+        return self.container_path(self.output_dir)
+
+    @property
+    def config_path(self) -> Optional[str]:
+        """The host path of the config.yml written by ns-train, if any."""
+        configs = [
+            path for path in self.files if os.path.basename(path) == CONFIG_FILE_NAME
+        ]
+        if not configs:
+            return None
+        return max(configs, key=os.path.getmtime)
+
+    @property
+    def container_config_path(self) -> Optional[str]:
+        """The config.yml written by ns-train, as seen from the container."""
+        return self.container_path(self.config_path)
+
+    @property
+    def checkpoint_dir(self) -> Optional[str]:
+        """The host path of the checkpoint directory of the training, if any."""
+        config_path = self.config_path
+        if config_path is None:
+            return None
+        checkpoint_dir = os.path.join(os.path.dirname(config_path), CHECKPOINT_DIR_NAME)
+        return checkpoint_dir if os.path.isdir(checkpoint_dir) else None
+
+    @property
+    def container_checkpoint_dir(self) -> Optional[str]:
+        """The checkpoint directory of the training, as seen from the container."""
+        return self.container_path(self.checkpoint_dir)
+
+    @property
+    def exports(self) -> list[str]:
+        """The host paths of the files written outside of training directories.
+
+        These are e.g. the splats or meshes written by ns-export, or the renders of
+        ns-render.
+        """
+        run_dirs = tuple(
+            os.path.dirname(path) + os.sep
+            for path in self.files
+            if os.path.basename(path) == CONFIG_FILE_NAME
+        )
+        return [path for path in self.files if not path.startswith(run_dirs)]
+
+
+class RunIndex:
+    """Records successful runs, so that commands that are up to date can be skipped.
+
+    Runs are keyed by their arguments and the fingerprints of their inputs (see
+    run_key()). The index is a small JSON file in root, shared across sessions and
+    processes; the output of each run is stored next to it, unless it already
+    lives in a log file.
+
+    Args:
+        root (str): The directory holding the index.
+    """
+
+    _INDEX_FILE = "index.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, self._INDEX_FILE)
+
+    @staticmethod
+    def run_key(argv: list[str], fingerprints: list[str]) -> str:
+        """Identifies a run by its arguments and the state of its inputs.
+
+        Args:
+            argv (list[str]): The command and its arguments.
+            fingerprints (list[str]): Fingerprints of the inputs of the command.
+
+        Returns:
+            str: A hex digest.
+        """
+        identity = json.dumps({"argv": argv, "inputs": fingerprints})
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _load(self) -> dict:
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, index: dict):
+        """Replaces the index file atomically. Must be called with the lock held."""
+        fd, partial_path = tempfile.mkstemp(prefix=".index-", dir=self.root)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(partial_path, self._index_path)
+
+    def get(
+        self, key: str, host_base_path: str = "", container_base_path: str = ""
+    ) -> Optional[RunResult]:
+        """Looks up a previous run.
+
+        Args:
+            key (str): The key of the run, see run_key().
+            host_base_path (str): The host directory mounted as the workspace.
+            container_base_path (str): The workspace directory inside the container.
+
+        Returns:
+            Optional[RunResult]: The result of the previous run, or None if there is
+                none or some of the files it wrote no longer exist.
+        """
+        entry = self._load().get(key)
+        if entry is None:
+            return None
+        if not all(os.path.exists(path) for path in entry["files"]):
+            logging.info(
+                f"Outputs of cached run {key[:12]} are missing, running again."
+            )
+            return None
+
+        output: Union[str, CommandLog] = ""
+        if entry.get("log") is not None:
+            if os.path.isfile(entry["log"]):
+                output = CommandLog(entry["log"], "")
+        else:
+            try:
+                with open(self._output_path(key), encoding="utf-8", newline="") as f:
+                    output = f.read()
+            except OSError:
+                pass
+
+        return RunResult(
+            entry["exit_code"],
+            output,
+            entry["files"],
+            entry["timings"],
+            host_base_path,
+            container_base_path,
+            entry.get("output_dirs"),
+            cached=True,
+        )
+
+    def put(self, key: str, argv: list[str], result: RunResult):
+        """Records a successful run.
+
+        Args:
+            key (str): The key of the run, see run_key().
+            argv (list[str]): The command and its arguments, for reference.
+            result (RunResult): The result of the run.
+        """
+        log_path = None
+        if isinstance(result.output, CommandLog):
+            log_path = result.output.path
+        else:
+            with open(self._output_path(key), "w", encoding="utf-8", newline="") as f:
+                f.write(result.output)
+
+        with file_lock(self._index_path + ".lock"):
+            index = self._load()
+            index[key] = {
+                "argv": argv,
+                "exit_code": result.exit_code,
+                "files": result.files,
+                "output_dirs": result.output_dirs,
+                "timings": result.timings,
+                "log": log_path,
+                "created": time.time(),
+            }
+            self._save(index)
+
+    def _output_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.out")
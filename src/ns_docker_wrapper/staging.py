@@ -0,0 +1,897 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Callable, Iterable, Iterator, Optional
+
+# ioctl request number of FICLONE (Linux), shares the extents of a file on btrfs/xfs
+FICLONE = 0x40049409
+
+DEFAULT_IGNORE_PATTERNS = ("*.tmp",)
+
+
+class StagingReport(dict):
+    """The strategy used for each staged file, keyed by its relative path.
+
+    Besides the per-file strategies, it records how many bytes were staged and how
+    long it took, to report the copy throughput.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """The staging throughput in bytes per second."""
+        return self.num_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class FileFilter:
+    """Selects the files of a directory tree to stage.
+
+    Patterns are shell-style globs, matched against both the path relative to the
+    staged directory (with "/" separators) and the file or directory name. Files
+    named "*.tmp" are always skipped.
+
+    Args:
+        include (Optional[Iterable[str]]): If given, only files matching one of these
+            patterns are staged.
+        exclude (Optional[Iterable[str]]): Files and directories matching one of
+            these patterns are skipped.
+        extensions (Optional[Iterable[str]]): If given, only files with one of these
+            extensions are staged, e.g. [".jpg", ".png"]. Case-insensitive.
+        max_file_size (Optional[int]): Files larger than this many bytes are skipped.
+    """
+
+    def __init__(
+        self,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        extensions: Optional[Iterable[str]] = None,
+        max_file_size: Optional[int] = None,
+    ):
+        self.include = tuple(include or ())
+        self.exclude = DEFAULT_IGNORE_PATTERNS + tuple(exclude or ())
+        self.extensions = tuple(
+            sorted(
+                {
+                    (ext if ext.startswith(".") else f".{ext}").lower()
+                    for ext in extensions or ()
+                }
+            )
+        )
+        self.max_file_size = max_file_size
+
+    def key(self) -> str:
+        """Returns a string identifying the filter, empty for the default filter."""
+        if self == FileFilter():
+            return ""
+        return json.dumps(
+            [self.include, self.exclude, self.extensions, self.max_file_size]
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FileFilter) and (
+            self.include,
+            self.exclude,
+            self.extensions,
+            self.max_file_size,
+        ) == (other.include, other.exclude, other.extensions, other.max_file_size)
+
+    def __hash__(self) -> int:
+        return hash((self.include, self.exclude, self.extensions, self.max_file_size))
+
+    @staticmethod
+    def _matches(rel_path: str, patterns: tuple[str, ...]) -> bool:
+        rel_path = rel_path.replace(os.sep, "/")
+        name = rel_path.rsplit("/", 1)[-1]
+        return any(
+            fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern)
+            for pattern in patterns
+        )
+
+    def accepts_dir(self, rel_path: str) -> bool:
+        """Checks whether a directory should be walked.
+
+        Args:
+            rel_path (str): The directory path relative to the staged directory.
+
+        Returns:
+            bool: False if the directory is excluded.
+        """
+        return not self._matches(rel_path, self.exclude)
+
+    def accepts_file(self, rel_path: str, file_path: str) -> bool:
+        """Checks whether a file should be staged.
+
+        Args:
+            rel_path (str): The file path relative to the staged directory.
+            file_path (str): The full path of the file, used for the size check.
+
+        Returns:
+            bool: True if the file passes every criterion.
+        """
+        if self._matches(rel_path, self.exclude):
+            return False
+        if self.include and not self._matches(rel_path, self.include):
+            return False
+        if (
+            self.extensions
+            and os.path.splitext(rel_path)[1].lower() not in self.extensions
+        ):
+            return False
+        if (
+            self.max_file_size is not None
+            and os.path.getsize(file_path) > self.max_file_size
+        ):
+            return False
+        return True
+
+
+def same_filesystem(src_path: str, dest_dir: str) -> bool:
+    """Checks whether two paths live on the same filesystem.
+
+    Args:
+        src_path (str): The source file or directory.
+        dest_dir (str): An existing destination directory.
+
+    Returns:
+        bool: True if both paths are on the same device.
+    """
+    try:
+        return os.stat(src_path).st_dev == os.stat(dest_dir).st_dev
+    except OSError:
+        return False
+
+
+def _reflink(src_path: str, dest_path: str) -> bool:
+    """Clones a file with the FICLONE ioctl.
+
+    Returns:
+        bool: True if the clone succeeded.
+    """
+    try:
+        import fcntl
+    except ImportError:  # not available on Windows
+        return False
+
+    try:
+        with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+    except OSError:
+        _remove_if_exists(dest_path)
+        return False
+    shutil.copymode(src_path, dest_path)
+    return True
+
+
+def _copy_file_range(src_path: str, dest_path: str) -> bool:
+    """Copies a file in-kernel with copy_file_range, which reflinks when it can.
+
+    Returns:
+        bool: True if the copy succeeded.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    try:
+        with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            remaining = os.fstat(src.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dest.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        if remaining > 0:
+            raise OSError("copy_file_range stopped before the end of the file")
+    except OSError:
+        _remove_if_exists(dest_path)
+        return False
+    shutil.copymode(src_path, dest_path)
+    return True
+
+
+def _hardlink(src_path: str, dest_path: str) -> bool:
+    """Hard links a file.
+
+    Returns:
+        bool: True if the link was created.
+    """
+    try:
+        os.link(src_path, dest_path)
+    except OSError:
+        return False
+    return True
+
+
+def _remove_if_exists(path: str):
+    """Removes a file, ignoring missing files."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def copy_file(
+    src_path: str,
+    dest_path: str,
+    same_fs: bool = False,
+    allow_hardlink: bool = False,
+) -> str:
+    """Copies a single file using the cheapest available strategy.
+
+    On the same filesystem the file is first cloned (FICLONE, then hard link if
+    allowed, then copy_file_range). Otherwise, or if every fast path fails, the
+    bytes are copied with shutil.copy, which uses sendfile on Linux.
+
+    Args:
+        src_path (str): The file to copy.
+        dest_path (str): The destination file. It is overwritten if it exists.
+        same_fs (bool): Whether the source and destination share a filesystem.
+        allow_hardlink (bool): Whether hard links may be used. The staged file then
+            shares its content with the source, so it must only be read.
+
+    Returns:
+        str: The strategy that was used: "reflink", "hardlink", "copy_file_range"
+            or "copy".
+    """
+    _remove_if_exists(dest_path)
+
+    if same_fs:
+        if _reflink(src_path, dest_path):
+            return "reflink"
+        if allow_hardlink and _hardlink(src_path, dest_path):
+            return "hardlink"
+        if _copy_file_range(src_path, dest_path):
+            return "copy_file_range"
+
+    shutil.copy(src_path, dest_path)
+    return "copy"
+
+
+def iter_files(
+    src_dir: str, file_filter: Optional[FileFilter] = None
+) -> Iterator[tuple[str, str]]:
+    """Walks the files of a directory tree.
+
+    Args:
+        src_dir (str): The directory to walk.
+        file_filter (Optional[FileFilter]): Selects the files to yield. Defaults to
+            every file except "*.tmp" ones.
+
+    Yields:
+        tuple[str, str]: The path of each file relative to src_dir, and its full path.
+    """
+    file_filter = file_filter or FileFilter()
+    for root, dirs, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        dirs[:] = [
+            d
+            for d in dirs
+            if file_filter.accepts_dir(os.path.normpath(os.path.join(rel_root, d)))
+        ]
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            rel_path = os.path.normpath(os.path.join(rel_root, name))
+            if file_filter.accepts_file(rel_path, file_path):
+                yield rel_path, file_path
+
+
+def _copy_files(
+    jobs: list[tuple[str, str, str]],
+    report: StagingReport,
+    same_fs: bool,
+    allow_hardlink: bool,
+    workers: Optional[int],
+):
+    """Copies files concurrently with a thread pool.
+
+    Args:
+        jobs (list[tuple[str, str, str]]): (relative path, source, destination)
+            of each file to copy.
+        report (StagingReport): The report to fill with the strategy of each file.
+        same_fs (bool): Whether the source and destination share a filesystem.
+        allow_hardlink (bool): Whether hard links may be used, see copy_file().
+        workers (Optional[int]): The number of copy threads, or None for the
+            ThreadPoolExecutor default.
+    """
+
+    def copy_job(job: tuple[str, str, str]) -> tuple[str, str, int]:
+        rel_path, src_path, dest_path = job
+        strategy = copy_file(
+            src_path, dest_path, same_fs=same_fs, allow_hardlink=allow_hardlink
+        )
+        return rel_path, strategy, os.path.getsize(dest_path)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for rel_path, strategy, num_bytes in executor.map(copy_job, jobs):
+            report[rel_path] = strategy
+            report.num_bytes += num_bytes
+
+
+def copy_tree(
+    src_dir: str,
+    dest_dir: str,
+    file_filter: Optional[FileFilter] = None,
+    allow_hardlink: bool = False,
+    workers: Optional[int] = None,
+) -> StagingReport:
+    """Copies a directory tree in parallel, cloning files when possible.
+
+    Existing files in the destination are overwritten.
+
+    Args:
+        src_dir (str): The directory to copy.
+        dest_dir (str): The destination directory.
+        file_filter (Optional[FileFilter]): Selects the files to copy.
+        allow_hardlink (bool): Whether hard links may be used, see copy_file().
+        workers (Optional[int]): The number of copy threads, or None for the
+            ThreadPoolExecutor default.
+
+    Returns:
+        StagingReport: The strategy used for each file, keyed by its path relative
+            to src_dir.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(dest_dir, exist_ok=True)
+    same_fs = same_filesystem(src_dir, dest_dir)
+
+    jobs = []
+    created_dirs = {dest_dir}
+    for rel_path, file_path in iter_files(src_dir, file_filter):
+        dest_path = os.path.join(dest_dir, rel_path)
+        dest_root = os.path.dirname(dest_path)
+        if dest_root not in created_dirs:
+            os.makedirs(dest_root, exist_ok=True)
+            created_dirs.add(dest_root)
+        jobs.append((rel_path, file_path, dest_path))
+
+    report = StagingReport()
+    _copy_files(jobs, report, same_fs, allow_hardlink, workers)
+    report.elapsed = time.perf_counter() - start_time
+    return report
+
+
+def log_report(src_path: str, report: StagingReport):
+    """Logs the strategies used to stage a file or directory.
+
+    Each file is logged at debug level, followed by a summary with the throughput
+    at info level.
+
+    Args:
+        src_path (str): The staged file or directory.
+        report (StagingReport): The strategy used for each file.
+    """
+    for rel_path, strategy in report.items():
+        logging.debug(f"Staged {os.path.join(src_path, rel_path)} ({strategy})")
+
+    counts = Counter(report.values())
+    summary = ", ".join(f"{strategy}: {count}" for strategy, count in counts.items())
+    logging.info(
+        f"Staged {src_path} ({len(report)} file(s): {summary or 'empty'}) - "
+        f"{report.num_bytes / 1024**2:.1f} MiB in {report.elapsed:.2f} s "
+        f"({report.throughput / 1024**2:.1f} MiB/s)"
+    )
+
+
+def disk_usage(path: str) -> int:
+    """Returns the total size in bytes of a file or of the files in a directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def fingerprint(src_path: str, file_filter: Optional[FileFilter] = None) -> str:
+    """Computes a fingerprint of a file or directory from its metadata.
+
+    The fingerprint covers the absolute source path and the relative path, size and
+    modification time of every file, so it changes whenever a file is added, removed
+    or modified. File contents are not read.
+
+    Args:
+        src_path (str): The file or directory to fingerprint.
+        file_filter (Optional[FileFilter]): Selects the files of a directory to
+            take into account.
+
+    Returns:
+        str: A hex digest identifying the current state of the source.
+    """
+    src_path = os.path.abspath(src_path)
+    digest = hashlib.sha256(src_path.encode("utf-8"))
+
+    if os.path.isfile(src_path):
+        entries = [(os.path.basename(src_path), os.stat(src_path))]
+    else:
+        entries = [
+            (rel_path, os.stat(file_path))
+            for rel_path, file_path in iter_files(src_path, file_filter)
+        ]
+
+    for rel_path, stat in sorted(entries, key=lambda entry: entry[0]):
+        digest.update(
+            f"\0{rel_path}\0{stat.st_size}\0{stat.st_mtime_ns}".encode("utf-8")
+        )
+    return digest.hexdigest()
+
+
+class StagingCache:
+    """A persistent store of staged inputs shared across sessions and processes.
+
+    Each entry lives in ``<root>/<key>/`` where key is a fingerprint of the source
+    (see fingerprint()). Entries are built in a private directory and renamed into
+    place, so concurrent processes never see a partial entry. When the total size
+    exceeds max_size, the least recently used entries are evicted.
+
+    A process using an entry holds a shared lock on its lease file, in
+    ``<root>/.leases/``, until release() is called or the process exits. Entries
+    leased by any process are never evicted.
+
+    Args:
+        root (str): The directory holding the cache entries.
+        max_size (Optional[int]): The size budget in bytes, or None for no limit.
+    """
+
+    _METADATA_FILE = "entry.json"
+    _LEASES_DIR = ".leases"
+
+    def __init__(self, root: str, max_size: Optional[int] = None):
+        self.root = root
+        self.max_size = max_size
+        # Key -> open lease file of the entries used by this process
+        self._leases: dict[str, Optional[IO]] = {}
+        self._leases_lock = threading.Lock()
+        os.makedirs(os.path.join(self.root, self._LEASES_DIR), exist_ok=True)
+
+    def _lease_path(self, key: str) -> str:
+        return os.path.join(self.root, self._LEASES_DIR, f"{key}.lock")
+
+    def _lease(self, key: str):
+        """Takes a shared lease on an entry, blocking while it is being evicted."""
+        with self._leases_lock:
+            if key in self._leases:
+                return
+            try:
+                import fcntl
+            except ImportError:  # not available on Windows, leases are per process
+                self._leases[key] = None
+                return
+            lease_file = open(self._lease_path(key), "a")
+            fcntl.flock(lease_file.fileno(), fcntl.LOCK_SH)
+            self._leases[key] = lease_file
+
+    def _unlease(self, key: str):
+        with self._leases_lock:
+            lease_file = self._leases.pop(key, None)
+        if lease_file is not None:
+            lease_file.close()
+
+    def release(self):
+        """Releases the leases of this process, letting other processes evict them."""
+        with self._leases_lock:
+            leases, self._leases = self._leases, {}
+        for lease_file in leases.values():
+            if lease_file is not None:
+                lease_file.close()
+
+    def entry_path(self, key: str) -> str:
+        """Returns the directory of a cache entry."""
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Looks up an entry and marks it as recently used.
+
+        Args:
+            key (str): The fingerprint of the source.
+
+        Returns:
+            Optional[str]: The entry directory, or None on a cache miss.
+        """
+        entry_path = self.entry_path(key)
+        metadata_path = os.path.join(entry_path, self._METADATA_FILE)
+        if not os.path.isfile(metadata_path):
+            return None
+        # Lease first, then check that the entry was not evicted in the meantime
+        leased = key in self._leases
+        self._lease(key)
+        if not os.path.isfile(metadata_path):
+            if not leased:
+                self._unlease(key)
+            return None
+        os.utime(metadata_path)
+        return entry_path
+
+    def add(self, key: str, populate: Callable[[str], int]) -> str:
+        """Creates an entry if it does not exist yet.
+
+        Args:
+            key (str): The fingerprint of the source.
+            populate (Callable[[str], int]): Fills the given directory with the staged
+                data and returns its size in bytes.
+
+        Returns:
+            str: The entry directory.
+        """
+        entry_path = self.get(key)
+        if entry_path is not None:
+            return entry_path
+
+        self._lease(key)
+        partial_path = tempfile.mkdtemp(prefix=f".partial-{key[:12]}-", dir=self.root)
+        try:
+            size = populate(partial_path)
+            with open(os.path.join(partial_path, self._METADATA_FILE), "w") as f:
+                json.dump({"size": size, "created": time.time()}, f)
+            os.rename(partial_path, self.entry_path(key))
+        except OSError:
+            # Another process created the same entry first
+            if not os.path.isdir(self.entry_path(key)):
+                raise
+        finally:
+            if os.path.isdir(partial_path):
+                shutil.rmtree(partial_path, ignore_errors=True)
+
+        self.evict()
+        return self.entry_path(key)
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """Lists the complete entries as (last used, size, key) tuples."""
+        entries = []
+        for key in os.listdir(self.root):
+            metadata_path = os.path.join(self.root, key, self._METADATA_FILE)
+            try:
+                with open(metadata_path) as f:
+                    size = json.load(f)["size"]
+                last_used = os.stat(metadata_path).st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((last_used, size, key))
+        return entries
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_size.
+
+        Entries leased by any process are never evicted.
+        """
+        if self.max_size is None:
+            return
+
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total_size <= self.max_size:
+                break
+            if key in self._leases or not self._remove_unleased(key):
+                continue
+            total_size -= size
+            logging.info(f"Evicted staging cache entry {key[:12]} ({size} bytes)")
+
+    def _remove_unleased(self, key: str) -> bool:
+        """Removes an entry unless a process holds a lease on it.
+
+        Returns:
+            bool: Whether the entry was removed.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None  # type: ignore
+
+        with open(self._lease_path(key), "a") as lease_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lease_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False  # In use by another process
+            # Rename first so that other processes stop seeing the entry right away
+            trash_path = tempfile.mkdtemp(prefix=".trash-", dir=self.root)
+            try:
+                os.rename(self.entry_path(key), os.path.join(trash_path, key))
+            except OSError:
+                os.rmdir(trash_path)
+                return False
+            # Closing the file releases the lock
+        shutil.rmtree(trash_path, ignore_errors=True)
+        return True
+
+
+def file_hash(path: str) -> str:
+    """Returns the SHA-256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive advisory lock on a file for the duration of the block.
+
+    On platforms without fcntl the block runs unlocked.
+
+    Args:
+        path (str): The lock file, created if needed.
+    """
+    try:
+        import fcntl
+    except ImportError:  # not available on Windows
+        yield
+        return
+
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def sync_tree(
+    src_dir: str,
+    dest_dir: str,
+    manifest_path: str,
+    file_filter: Optional[FileFilter] = None,
+    allow_hardlink: bool = False,
+    checksum: bool = False,
+    workers: Optional[int] = None,
+) -> StagingReport:
+    """Incrementally mirrors a directory tree, like rsync.
+
+    A manifest recording the relative path, size, modification time and optionally
+    the content hash of every staged file is kept in manifest_path. Only files that
+    were added or changed since the last sync are copied, and files that were
+    removed from the source are deleted from the destination.
+
+    Args:
+        src_dir (str): The directory to mirror.
+        dest_dir (str): The destination directory.
+        manifest_path (str): The JSON manifest of the previous sync.
+        file_filter (Optional[FileFilter]): Selects the files to mirror. Files it
+            rejects are deleted from the destination.
+        allow_hardlink (bool): Whether hard links may be used, see copy_file().
+        checksum (bool): Whether to also compare content hashes, so that files
+            whose content changed without a size or time change are detected.
+        workers (Optional[int]): The number of copy threads, or None for the
+            ThreadPoolExecutor default.
+
+    Returns:
+        StagingReport: What happened to each file, keyed by its path relative to
+            src_dir: a copy strategy (see copy_file()), "unchanged" or "deleted".
+    """
+    start_time = time.perf_counter()
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    os.makedirs(dest_dir, exist_ok=True)
+    same_fs = same_filesystem(src_dir, dest_dir)
+
+    report = StagingReport()
+    new_manifest = {}
+    jobs = []
+    for rel_path, file_path in iter_files(src_dir, file_filter):
+        stat = os.stat(file_path)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if checksum:
+            entry["sha256"] = file_hash(file_path)
+
+        dest_path = os.path.join(dest_dir, rel_path)
+        previous = manifest.get(rel_path)
+        if (
+            previous == entry
+            and os.path.isfile(dest_path)
+            and os.path.getsize(dest_path) == stat.st_size
+        ):
+            report[rel_path] = "unchanged"
+        else:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            jobs.append((rel_path, file_path, dest_path))
+        new_manifest[rel_path] = entry
+
+    _copy_files(jobs, report, same_fs, allow_hardlink, workers)
+
+    for rel_path in manifest.keys() - new_manifest.keys():
+        _remove_if_exists(os.path.join(dest_dir, rel_path))
+        report[rel_path] = "deleted"
+
+    # Drop the directories emptied by deletions
+    for root, _, _ in os.walk(dest_dir, topdown=False):
+        if root != dest_dir and not os.listdir(root):
+            os.rmdir(root)
+
+    partial_manifest_path = f"{manifest_path}.partial"
+    with open(partial_manifest_path, "w") as f:
+        json.dump(new_manifest, f)
+    os.replace(partial_manifest_path, manifest_path)
+    report.elapsed = time.perf_counter() - start_time
+    return report
+
+
+ARCHIVE_COMPRESSIONS = (None, "gzip", "zstd")
+
+
+def iter_tar_stream(
+    src_path: str,
+    arcname: str,
+    file_filter: Optional[FileFilter] = None,
+    compression: Optional[str] = None,
+    chunk_size: int = 1024 * 1024,
+    report: Optional[StagingReport] = None,
+) -> Iterator[bytes]:
+    """Streams a file or directory as a tar archive.
+
+    The archive is written by a background thread into a pipe and yielded chunk by
+    chunk, so it is never held in memory or written to disk as a whole.
+
+    Args:
+        src_path (str): The file or directory to archive.
+        arcname (str): The name of src_path inside the archive.
+        file_filter (Optional[FileFilter]): Selects the files of a directory to
+            archive.
+        compression (Optional[str]): None, "gzip" or "zstd". zstd requires the
+            zstandard package.
+        chunk_size (int): The size of the yielded chunks in bytes.
+        report (Optional[StagingReport]): If given, filled with every archived file
+            and the number of uncompressed bytes.
+
+    Yields:
+        bytes: The next chunk of the archive.
+
+    Raises:
+        ValueError: If the compression is unknown.
+        ImportError: If zstd is requested and zstandard is not installed.
+    """
+    if compression not in ARCHIVE_COMPRESSIONS:
+        raise ValueError(
+            f"Unknown archive compression '{compression}'. Expected one of {ARCHIVE_COMPRESSIONS}."
+        )
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "zstd compression requires the zstandard package: pip install zstandard"
+            )
+
+    if os.path.isdir(src_path):
+        members = [
+            (file_path, os.path.join(arcname, rel_path))
+            for rel_path, file_path in iter_files(src_path, file_filter)
+        ]
+    else:
+        members = [(src_path, arcname)]
+
+    read_fd, write_fd = os.pipe()
+    errors: list[BaseException] = []
+
+    def write_archive():
+        try:
+            with os.fdopen(write_fd, "wb") as pipe:
+                if compression == "zstd":
+                    compressor = zstandard.ZstdCompressor().stream_writer(
+                        pipe, closefd=False
+                    )
+                    fileobj, mode = compressor, "w|"
+                else:
+                    compressor = None
+                    fileobj, mode = pipe, "w|gz" if compression == "gzip" else "w|"
+
+                with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+                    for file_path, member_name in members:
+                        tar.add(file_path, arcname=member_name, recursive=False)
+                        if report is not None:
+                            report[os.path.relpath(member_name, arcname)] = "archive"
+                            report.num_bytes += os.path.getsize(file_path)
+                if compressor is not None:
+                    compressor.close()
+        except BrokenPipeError:
+            pass  # the consumer stopped reading
+        except BaseException as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write_archive, name="nsdw-tar", daemon=True)
+    writer.start()
+    try:
+        with os.fdopen(read_fd, "rb") as pipe:
+            for chunk in iter(lambda: pipe.read(chunk_size), b""):
+                yield chunk
+    finally:
+        writer.join()
+    if errors:
+        raise errors[0]
+
+
+def make_archive_directory(container, container_dir: str, owner: Optional[str] = None):
+    """Creates the directory an archive is extracted into, inside a container.
+
+    The directory is created as root, since the container user cannot write to the
+    container root, then given to owner so the commands can write next to the
+    extracted data.
+
+    Args:
+        container: A Docker container (docker.models.containers.Container), or any
+            object with a compatible exec_run(cmd, user) method.
+        container_dir (str): The directory to create.
+        owner (Optional[str]): The user (uid or uid:gid) the commands run as. None
+            leaves the directory to root.
+
+    Raises:
+        RuntimeError: If the directory cannot be created.
+    """
+    command = ["mkdir", "-p", container_dir]
+    if owner is not None:
+        command = [
+            "sh",
+            "-c",
+            'mkdir -p "$1" && chown "$2" "$1"',
+            "sh",
+            container_dir,
+            owner,
+        ]
+    exit_code, output = container.exec_run(command, user="root")
+    if exit_code != 0:
+        raise RuntimeError(
+            f"Failed to create {container_dir} in the container: {output!r}"
+        )
+
+
+def put_archive(
+    api_client,
+    container_id: str,
+    src_path: str,
+    container_dir: str,
+    arcname: str,
+    file_filter: Optional[FileFilter] = None,
+    compression: Optional[str] = None,
+) -> StagingReport:
+    """Streams a file or directory into a container with the Docker archive API.
+
+    This works with remote Docker daemons, since no host path is shared with the
+    container. The tar stream is uploaded while it is being produced.
+
+    Args:
+        api_client: A low-level Docker API client (docker.APIClient), or any object
+            with a compatible put_archive(container, path, data) method.
+        container_id (str): The container to copy to.
+        src_path (str): The file or directory to copy.
+        container_dir (str): The existing directory inside the container to extract
+            the archive into.
+        arcname (str): The name of src_path inside container_dir.
+        file_filter (Optional[FileFilter]): Selects the files of a directory to copy.
+        compression (Optional[str]): None, "gzip" or "zstd". The daemon must support
+            the chosen compression.
+
+    Returns:
+        StagingReport: The archived files, all with the "archive" strategy.
+
+    Raises:
+        RuntimeError: If the daemon rejects the archive.
+    """
+    start_time = time.perf_counter()
+    report = StagingReport()
+    stream = iter_tar_stream(
+        src_path, arcname, file_filter, compression=compression, report=report
+    )
+    if not api_client.put_archive(container_id, container_dir, stream):
+        raise RuntimeError(
+            f"Failed to copy {src_path} to {container_dir} in the container"
+        )
+    report.elapsed = time.perf_counter() - start_time
+    return report
@@ -0,0 +1,282 @@
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import random
+from typing import Any, Callable, Optional, Sequence, Union
+
+from .commands import Command
+from .pipeline import Pipeline
+from .progress import ProgressEvent
+from .results import RunResult
+
+# A list of values to try, or a function drawing a value from a random generator
+ParameterValues = Union[Sequence[Any], Callable[[random.Random], Any]]
+
+
+class Trial:
+    """A configuration of a sweep, and what its training reported.
+
+    Args:
+        name (str): The name of the trial, e.g. "trial-003".
+        params (dict[str, Any]): The value of each swept argument, by name.
+        output_dir (str): The output directory of the trial, relative to
+            output_base_path.
+    """
+
+    def __init__(self, name: str, params: dict[str, Any], output_dir: str):
+        self.name = name
+        self.params = params
+        self.output_dir = output_dir
+        self.result: Optional[RunResult] = None
+        # Latest training progress, and metrics of the evaluation when enabled
+        self.progress: Optional[ProgressEvent] = None
+        self.eval_results: dict[str, float] = {}
+        self.error: Optional[BaseException] = None
+
+    def __repr__(self) -> str:
+        return f"Trial({self.name!r}, {self.params!r})"
+
+    def _reset(self):
+        self.result = None
+        self.progress = None
+        self.eval_results = {}
+        self.error = None
+
+    def _record_progress(self, event: ProgressEvent):
+        self.progress = event
+
+    @property
+    def metrics(self) -> dict[str, float]:
+        """The final metrics of the trial.
+
+        These are the step, loss, PSNR and throughput last printed by ns-train,
+        then the metrics computed by ns-eval (psnr, ssim, lpips...) when the sweep
+        evaluates the trials. Missing values are left out.
+        """
+        metrics: dict[str, float] = {}
+        if self.progress is not None:
+            for name, value in (
+                ("step", self.progress.step),
+                ("train_loss", self.progress.loss),
+                ("train_psnr", self.progress.psnr),
+                ("iterations_per_second", self.progress.iterations_per_second),
+            ):
+                if value is not None:
+                    metrics[name] = value
+        metrics.update(self.eval_results)
+        return metrics
+
+    @property
+    def status(self) -> str:
+        """The state of the trial: "succeeded", "failed" or "pending"."""
+        if self.error is not None or (
+            self.result is not None and self.result.exit_code
+        ):
+            return "failed"
+        return "pending" if self.result is None else "succeeded"
+
+
+class Sweep:
+    """Trains a base command over a space of argument values.
+
+    The space maps argument names, in the dot-notation of the commands (e.g.
+    "pipeline.model.cull_alpha_thresh"), to the values to try. Every combination
+    is tried (a grid search), or only samples of them when samples is given (a
+    random search). Each trial writes to its own output directory, and trials run
+    as GPU stages of a Pipeline, so at most one trial per GPU runs at once.
+
+    Args:
+        base (Command): The ns-train command to sweep, with the arguments shared by
+            every trial. Its inputs are staged once.
+        space (dict[str, ParameterValues]): The values of each argument: a list,
+            or for random searches a function drawing a value from a
+            random.Random, e.g. ``lambda rng: 10 ** rng.uniform(-4, -2)``.
+        output_dir (str): The directory of the trials, relative to output_base_path.
+            Trial i writes to output_dir/trial-i.
+        samples (Optional[int]): The number of random trials. None tries every
+            combination.
+        seed (Optional[int]): The seed of the random search.
+        evaluate (bool): Whether each trained model is evaluated with ns-eval, to
+            add its test metrics to the table.
+        max_concurrency (Optional[int]): The number of trials running at once. None
+            uses the number of GPUs of the manager's GPU pool, or 1.
+        num_gpus (Optional[int]): The number of GPUs of each trial.
+        echo (bool): Whether the output of the commands is written to stdout.
+        memoize (bool): Whether trials that already succeeded are skipped, see
+            Command.run().
+
+    Raises:
+        ValueError: If the space is empty, or a grid search is given a function.
+    """
+
+    def __init__(
+        self,
+        base: Command,
+        space: dict[str, ParameterValues],
+        output_dir: str = "sweeps",
+        samples: Optional[int] = None,
+        seed: Optional[int] = None,
+        evaluate: bool = False,
+        max_concurrency: Optional[int] = None,
+        num_gpus: Optional[int] = None,
+        echo: bool = False,
+        memoize: bool = False,
+    ):
+        if not space:
+            raise ValueError("The space of a sweep needs at least one argument.")
+        self.base = base
+        self.space = space
+        self.output_dir = output_dir.rstrip("/")
+        self.evaluate = evaluate
+        self.max_concurrency = max_concurrency
+        self.num_gpus = num_gpus
+        self.echo = echo
+        self.memoize = memoize
+        self.trials = [
+            Trial(f"trial-{i:03d}", params, f"{self.output_dir}/trial-{i:03d}")
+            for i, params in enumerate(self._expand(samples, seed))
+        ]
+
+    def _expand(
+        self, samples: Optional[int], seed: Optional[int]
+    ) -> list[dict[str, Any]]:
+        """Lists the argument values of the trials."""
+        names = list(self.space)
+        if samples is None:
+            for name, values in self.space.items():
+                if callable(values):
+                    raise ValueError(
+                        f"Argument '{name}' is drawn from a function, which needs samples."
+                    )
+            return [
+                dict(zip(names, values))
+                for values in itertools.product(*self.space.values())  # type: ignore
+            ]
+
+        rng = random.Random(seed)
+        return [
+            {
+                name: values(rng) if callable(values) else rng.choice(values)
+                for name, values in self.space.items()
+            }
+            for _ in range(samples)
+        ]
+
+    def _command(self, trial: Trial) -> Command:
+        """Builds the training command of a trial."""
+        command = self.base._copy()
+        for name, value in trial.params.items():
+            command._set_arg(name, value)
+        return command._set_arg("output_dir", trial.output_dir)
+
+    def _eval_command(self, trial: Trial, trained: RunResult) -> Command:
+        """Builds the ns-eval command of a trained trial."""
+        if trained.container_config_path is None:
+            raise RuntimeError(f"{trial.name} did not write a config.yml.")
+        command = Command("ns-eval", self.base._manager)
+        command._add_arg("load_config", trained.container_config_path)
+        return command._add_arg("output_path", f"{trial.output_dir}/eval.json")
+
+    def _read_eval_results(self, trial: Trial, result: RunResult):
+        """Loads the metrics written by ns-eval for a trial."""
+        for path in result.files:
+            if not path.endswith("eval.json"):
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    results = json.load(f).get("results", {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read the evaluation of {trial.name}: {e}")
+                return
+            trial.eval_results = {
+                name: value
+                for name, value in results.items()
+                if isinstance(value, (int, float))
+            }
+
+    def run(self) -> list[dict[str, Any]]:
+        """Runs the trials, then returns the table of their metrics.
+
+        Failed trials are reported in the table rather than raised.
+
+        Returns:
+            list[dict[str, Any]]: The rows of the table, see table().
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> list[dict[str, Any]]:
+        """Runs the trials from an event loop, see run().
+
+        Cancelling the task terminates the running trials.
+        """
+        pipeline = Pipeline(
+            gpu_slots=self.max_concurrency, echo=self.echo, manager=self.base._manager
+        )
+        for trial in self.trials:
+            trial._reset()
+            trained = pipeline.add(
+                trial.name,
+                lambda trial=trial: self._command(trial),
+                resource="gpu",
+                num_gpus=self.num_gpus,
+                memoize=self.memoize,
+                on_progress=trial._record_progress,
+            )
+            if self.evaluate:
+                pipeline.add(
+                    f"{trial.name}/eval",
+                    lambda trained, trial=trial: self._eval_command(trial, trained),
+                    after=[trained],
+                    resource="gpu",
+                    num_gpus=self.num_gpus,
+                    memoize=self.memoize,
+                )
+
+        try:
+            await pipeline.run_async()
+        except RuntimeError as e:
+            logging.warning(f"Sweep finished with failures. {e}")
+
+        for trial in self.trials:
+            trial.result = pipeline.results.get(trial.name)
+            trial.error = pipeline.errors.get(trial.name)
+            evaluation = pipeline.results.get(f"{trial.name}/eval")
+            if evaluation is not None and evaluation.exit_code == 0:
+                self._read_eval_results(trial, evaluation)
+        return self.table()
+
+    def table(self) -> list[dict[str, Any]]:
+        """Returns the parameters and final metrics of the trials.
+
+        Returns:
+            list[dict[str, Any]]: One row per trial, with its "trial" name, "status",
+                the value of each swept argument, its "config_path" and its
+                metrics (see Trial.metrics).
+        """
+        rows = []
+        for trial in self.trials:
+            row: dict[str, Any] = {"trial": trial.name, "status": trial.status}
+            row.update(trial.params)
+            row["config_path"] = (
+                trial.result.config_path if trial.result is not None else None
+            )
+            row.update(trial.metrics)
+            rows.append(row)
+        return rows
+
+    def to_csv(self, path: str):
+        """Writes the table of the trials to a CSV file.
+
+        Args:
+            path (str): The path of the CSV file.
+        """
+        rows = self.table()
+        columns: dict[str, None] = {}
+        for row in rows:
+            columns.update(dict.fromkeys(row))
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(columns))
+            writer.writeheader()
+            writer.writerows(rows)
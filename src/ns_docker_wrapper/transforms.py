@@ -0,0 +1,214 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from .staging import FileFilter, StagingReport, copy_file, iter_files, same_filesystem
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp")
+
+
+def _require_pillow():
+    """Imports Pillow, which is only needed for image transforms.
+
+    Raises:
+        ImportError: If Pillow is not installed.
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            "Image transforms require Pillow: pip install ns-docker-wrapper[images]"
+        )
+
+
+class ImageTransform:
+    """Resizes and re-encodes images on the host while they are staged.
+
+    Images are processed by a pool of processes. Besides the main copy, a downscale
+    pyramid can be written next to the staged directory using Nerfstudio's layout:
+    staging ``images`` also produces ``images_2``, ``images_4``, ``images_8``...
+    Files that are not images, and images that need no resizing, are copied
+    unchanged.
+
+    The workers are started with the "forkserver" method ("spawn" where it is not
+    available), since staging runs in a background thread and forking a threaded
+    process can deadlock. Like any multiprocessing code, scripts using transforms
+    need an ``if __name__ == "__main__":`` guard.
+
+    Args:
+        max_size (Optional[int]): The maximum size in pixels of the longest side of
+            the staged images. Larger images are downscaled, smaller ones are kept.
+        quality (int): The JPEG quality used to re-encode JPEG images.
+        num_downscales (int): The number of extra pyramid levels, each half the size
+            of the previous one.
+        workers (Optional[int]): The number of processes, or None for one per CPU.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        quality: int = 95,
+        num_downscales: int = 0,
+        workers: Optional[int] = None,
+    ):
+        _require_pillow()
+        self.max_size = max_size
+        self.quality = quality
+        self.num_downscales = num_downscales
+        self.workers = workers
+
+    def key(self) -> str:
+        """Returns a string identifying the output of the transform."""
+        return json.dumps(
+            {
+                "max_size": self.max_size,
+                "quality": self.quality,
+                "num_downscales": self.num_downscales,
+            }
+        )
+
+    def pyramid_paths(self, dest_path: str) -> list[tuple[int, str]]:
+        """Returns the downscale factors and directories of the pyramid levels.
+
+        Args:
+            dest_path (str): The staged directory.
+
+        Returns:
+            list[tuple[int, str]]: (factor, directory) of each extra level.
+        """
+        return [
+            (2**level, f"{dest_path}_{2**level}")
+            for level in range(1, self.num_downscales + 1)
+        ]
+
+    def apply(
+        self,
+        src_path: str,
+        dest_path: str,
+        file_filter: Optional[FileFilter] = None,
+    ) -> StagingReport:
+        """Stages a file or directory, transforming its images.
+
+        Args:
+            src_path (str): The file or directory to stage.
+            dest_path (str): The destination path. For directories, pyramid levels
+                are written to sibling directories (see pyramid_paths()).
+            file_filter (Optional[FileFilter]): Selects the files of a directory to
+                stage.
+
+        Returns:
+            StagingReport: "transform" for every resized image and the copy
+                strategy for the other files, keyed by their relative path.
+        """
+        start_time = time.perf_counter()
+        if os.path.isdir(src_path):
+            files = list(iter_files(src_path, file_filter))
+            dest_roots = [(1, dest_path)] + self.pyramid_paths(dest_path)
+        else:
+            files = [(os.path.basename(src_path), src_path)]
+            dest_path = os.path.dirname(dest_path)
+            dest_roots = [(1, dest_path)]
+
+        for _, dest_root in dest_roots:
+            os.makedirs(dest_root, exist_ok=True)
+        same_fs = same_filesystem(src_path, dest_path)
+
+        report = StagingReport()
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=_worker_context()
+        ) as executor:
+            futures = {}
+            for rel_path, file_path in files:
+                targets = [
+                    (factor, os.path.join(dest_root, rel_path))
+                    for factor, dest_root in dest_roots
+                ]
+                for _, target in targets:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+                if os.path.splitext(rel_path)[1].lower() in IMAGE_EXTENSIONS:
+                    futures[rel_path] = executor.submit(
+                        _transform_image,
+                        file_path,
+                        targets,
+                        self.max_size,
+                        self.quality,
+                        same_fs,
+                    )
+                else:
+                    report[rel_path] = copy_file(
+                        file_path, targets[0][1], same_fs=same_fs
+                    )
+                    report.num_bytes += os.path.getsize(targets[0][1])
+
+            for rel_path, future in futures.items():
+                num_bytes, strategy = future.result()
+                report.num_bytes += num_bytes
+                report[rel_path] = strategy
+
+        report.elapsed = time.perf_counter() - start_time
+        return report
+
+
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """Returns the multiprocessing context of the transform workers."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _transform_image(
+    src_path: str,
+    targets: list[tuple[int, str]],
+    max_size: Optional[int],
+    quality: int,
+    same_fs: bool = False,
+) -> tuple[int, str]:
+    """Writes the resized versions of an image. Runs in a worker process.
+
+    Versions with the size of the source are copied, not re-encoded.
+
+    Args:
+        src_path (str): The image to transform.
+        targets (list[tuple[int, str]]): (downscale factor, destination) of each
+            version, relative to the image capped at max_size.
+        max_size (Optional[int]): The maximum size of the longest side.
+        quality (int): The JPEG quality.
+        same_fs (bool): Whether the source and destinations share a filesystem.
+
+    Returns:
+        tuple[int, str]: The total number of bytes written, and the strategy of
+            the main version: "transform", or the copy strategy if it was kept.
+    """
+    from PIL import Image
+
+    num_bytes = 0
+    strategy = "transform"
+    with Image.open(src_path) as image:
+        save_kwargs = {}
+        if image.format == "JPEG":
+            save_kwargs = {"quality": quality, "exif": image.info.get("exif", b"")}
+        image_format = image.format
+
+        width, height = image.size
+        scale = 1.0
+        if max_size is not None and max(width, height) > max_size:
+            scale = max_size / max(width, height)
+
+        for factor, target in targets:
+            size = (
+                max(1, round(width * scale / factor)),
+                max(1, round(height * scale / factor)),
+            )
+            if size == image.size:
+                kept = copy_file(src_path, target, same_fs=same_fs)
+                if factor == 1:
+                    strategy = kept
+            else:
+                resized = image.resize(size, Image.Resampling.LANCZOS)
+                resized.save(target, format=image_format, **save_kwargs)
+            num_bytes += os.path.getsize(target)
+    return num_bytes, strategy